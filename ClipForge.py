@@ -1,13 +1,2435 @@
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox
 import cv2
-from PIL import Image, ImageTk
+import numpy as np
+from PIL import Image
 import pandas as pd
 from datetime import datetime
+import argparse
+import collections
+import concurrent.futures
+import multiprocessing
+import queue
 import threading
+import time
 import os
+import sys
+import hashlib
+import json
+import math
+import shutil
+import sqlite3
+import subprocess
+import tempfile
+
+# tkinter is only imported by import_gui(), so the headless export path and
+# export worker processes run on machines without a display or Tk
+tk = ttk = filedialog = messagebox = ImageTk = None
+
+def import_gui():
+    global tk, ttk, filedialog, messagebox, ImageTk
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox
+    from PIL import ImageTk
+
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "clipforge")
+DISPLAY_SIZE = (640, 360)
+PLAYBACK_SPEEDS = [-16, -8, -4, -3, -2, -1, 1, 2, 3, 4, 8, 16]
+
+def source_fingerprint(video_path, sample_bytes=1 << 20):
+    # Cheap content hash: file size plus the first and last megabyte, enough to
+    # tell sources apart without reading multi-gigabyte files end to end
+    size = os.path.getsize(video_path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(video_path, "rb") as f:
+        digest.update(f.read(sample_bytes))
+        if size > sample_bytes:
+            f.seek(max(sample_bytes, size - sample_bytes))
+            digest.update(f.read(sample_bytes))
+    return digest.hexdigest()
+
+class KeyframeIndex:
+    # Keyframe positions and per-frame presentation timestamps of a video,
+    # kept in a sidecar file next to it and rebuilt when its size/mtime change
+    VERSION = 1
+    
+    def __init__(self, pts, keyframes):
+        self.pts = np.asarray(pts, dtype=np.float64)
+        self.keyframes = np.asarray(keyframes, dtype=np.int64)
+    
+    @property
+    def frame_count(self):
+        return len(self.pts)
+    
+    @staticmethod
+    def sidecar_path(video_path):
+        return video_path + ".cfindex.npz"
+    
+    @staticmethod
+    def source_stamp(video_path):
+        stat = os.stat(video_path)
+        return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+    
+    @classmethod
+    def load(cls, video_path):
+        try:
+            with np.load(cls.sidecar_path(video_path)) as data:
+                if int(data["version"]) != cls.VERSION:
+                    return None
+                if not np.array_equal(data["stamp"], cls.source_stamp(video_path)):
+                    return None
+                return cls(data["pts"], data["keyframes"])
+        except (OSError, KeyError, ValueError):
+            return None
+    
+    def save(self, video_path):
+        path = self.sidecar_path(video_path)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, version=self.VERSION, stamp=self.source_stamp(video_path),
+                         pts=self.pts, keyframes=self.keyframes)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing keyframe index: {e}")
+    
+    @classmethod
+    def load_or_build(cls, video_path):
+        index = cls.load(video_path)
+        if index is None:
+            index = cls.build(video_path)
+            if index is not None:
+                index.save(video_path)
+        return index
+    
+    @classmethod
+    def build(cls, video_path):
+        packets = None
+        if shutil.which("ffprobe"):
+            packets = cls.probe_packets_ffprobe(video_path)
+        if not packets:
+            packets = cls.probe_packets_opencv(video_path)
+        if not packets:
+            return None
+        
+        # Packets arrive in decode order; frame N is the Nth smallest timestamp
+        pts = np.array([p[0] for p in packets], dtype=np.float64)
+        is_key = np.array([p[1] for p in packets], dtype=bool)
+        order = np.argsort(pts, kind="stable")
+        pts = pts[order]
+        keyframes = np.flatnonzero(is_key[order])
+        return cls(pts - pts[0], keyframes)
+    
+    @staticmethod
+    def probe_packets_ffprobe(video_path):
+        cmd = ["ffprobe", "-v", "error", "-select_streams", "v:0",
+               "-show_entries", "packet=pts_time,dts_time,flags", "-of", "csv=p=0", video_path]
+        try:
+            output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+        except (OSError, subprocess.CalledProcessError):
+            return None
+        
+        packets = []
+        for line in output.splitlines():
+            fields = line.strip().split(",")
+            if len(fields) < 3:
+                continue
+            pts_time, dts_time, flags = fields[0], fields[1], fields[2]
+            try:
+                timestamp = float(pts_time if pts_time not in ("", "N/A") else dts_time)
+            except ValueError:
+                continue
+            packets.append((timestamp, "K" in flags))
+        return packets
+    
+    @staticmethod
+    def probe_packets_opencv(video_path):
+        # Raw mode returns compressed packets without decoding them
+        cap = cv2.VideoCapture(video_path, cv2.CAP_FFMPEG, [cv2.CAP_PROP_FORMAT, -1])
+        raw = cap.isOpened()
+        if not raw:
+            cap = cv2.VideoCapture(video_path)
+        
+        packets = []
+        try:
+            while cap.grab():
+                is_key = bool(cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME)) if raw else False
+                packets.append((cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0, is_key))
+        finally:
+            cap.release()
+        return packets
+    
+    def keyframe_before(self, frame_num):
+        if len(self.keyframes) == 0:
+            return None
+        pos = np.searchsorted(self.keyframes, frame_num, side="right") - 1
+        return int(self.keyframes[max(pos, 0)])
+    
+    def keyframe_after(self, frame_num):
+        pos = np.searchsorted(self.keyframes, frame_num, side="right")
+        if pos >= len(self.keyframes):
+            return None
+        return int(self.keyframes[pos])
+    
+    def timestamp(self, frame_num, fps):
+        if frame_num < len(self.pts):
+            return float(self.pts[frame_num])
+        # Past the last indexed frame, continue at the nominal frame rate
+        last = len(self.pts) - 1
+        return float(self.pts[last]) + (frame_num - last) / fps
+
+class ProxyBuilder:
+    # Small, short-GOP copy of a source video used for playback and scrubbing.
+    # Cached on disk by source hash; exports always read the original
+    def __init__(self, video_path, width=640, height=360, keyframe_interval=8):
+        self.video_path = video_path
+        self.width = width
+        self.height = height
+        self.keyframe_interval = keyframe_interval
+    
+    def proxy_path(self):
+        # ffmpeg writes a short-GOP H.264 proxy; the OpenCV fallback writes
+        # MJPEG, where every frame is a keyframe
+        ext = ".mp4" if shutil.which("ffmpeg") else ".avi"
+        name = f"{source_fingerprint(self.video_path)}_{self.width}x{self.height}{ext}"
+        return os.path.join(CACHE_DIR, "proxies", name)
+    
+    def build(self):
+        path = self.proxy_path()
+        if os.path.exists(path):
+            return path
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        root, ext = os.path.splitext(path)
+        tmp_path = f"{root}.partial{ext}"
+        try:
+            if ext == ".mp4":
+                self.transcode_ffmpeg(tmp_path)
+            else:
+                self.transcode_opencv(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return path
+    
+    def transcode_ffmpeg(self, output_path):
+        # -vsync 0 keeps a 1:1 frame mapping so frame numbers match the source
+        scale = (f"scale='min({self.width},iw)':'min({self.height},ih)':force_original_aspect_ratio=decrease,"
+                 f"scale=trunc(iw/2)*2:trunc(ih/2)*2")
+        cmd = ["ffmpeg", "-y", "-v", "error", "-i", self.video_path, "-an", "-vsync", "0",
+               "-vf", scale, "-c:v", "libx264", "-preset", "veryfast", "-crf", "28",
+               "-g", str(self.keyframe_interval), "-pix_fmt", "yuv420p", output_path]
+        subprocess.run(cmd, capture_output=True, check=True)
+    
+    def transcode_opencv(self, output_path):
+        cap = cv2.VideoCapture(self.video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30
+        src_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        src_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        scale = min(1.0, self.width / src_w, self.height / src_h)
+        size = (max(2, int(src_w * scale) // 2 * 2), max(2, int(src_h * scale) // 2 * 2))
+        
+        out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+        try:
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                out.write(cv2.resize(frame, size, interpolation=cv2.INTER_AREA))
+        finally:
+            cap.release()
+            out.release()
+
+def histogram_features(frames, levels=4):
+    # Normalized colour histograms of a batch of small BGR frames, shape
+    # (n, levels**3), from one bincount over the whole batch
+    shift = 8 - int(math.log2(levels))
+    q = frames >> shift
+    bins = (q[..., 0].astype(np.int32) * levels + q[..., 1]) * levels + q[..., 2]
+    n, bin_count = len(frames), levels ** 3
+    bins += (np.arange(n, dtype=np.int32) * bin_count)[:, None, None]
+    counts = np.bincount(bins.ravel(), minlength=n * bin_count).reshape(n, bin_count)
+    return counts.astype(np.float32) / (frames.shape[1] * frames.shape[2])
+
+def _scene_scores_task(video_path, start_frame, end_frame, size=(64, 36), batch=256):
+    # Cut scores for frames start_frame..end_frame: half the L1 distance
+    # between each frame's colour histogram and the previous frame's (0..1).
+    # Runs in an analysis worker; the frame before the range is decoded too so
+    # ranges join up, and frame 0 scores 0
+    cap = cv2.VideoCapture(video_path)
+    reader = FrameReader(cap, index=KeyframeIndex.load(video_path))
+    first = max(0, start_frame - 1)
+    features = []
+    small = np.empty((batch, size[1], size[0], 3), dtype=np.uint8)
+    filled = 0
+    try:
+        for frame_num in range(first, end_frame + 1):
+            ret, frame = reader.read(frame_num)
+            if not ret:
+                break
+            cv2.resize(frame, size, dst=small[filled], interpolation=cv2.INTER_AREA)
+            filled += 1
+            if filled == batch:
+                features.append(histogram_features(small))
+                filled = 0
+        if filled:
+            features.append(histogram_features(small[:filled]))
+    finally:
+        cap.release()
+    
+    if not features:
+        return np.zeros(0, dtype=np.float32)
+    features = np.concatenate(features)
+    scores = 0.5 * np.abs(np.diff(features, axis=0)).sum(axis=1)
+    if first == start_frame:
+        scores = np.concatenate([np.zeros(1, dtype=np.float32), scores])
+    return scores.astype(np.float32)
+
+class SceneCutDetector:
+    # Proposes clip boundaries at hard cuts. Frames are decoded once and scored
+    # at thumbnail size (from the playback proxy when there is one, which has
+    # the same frame numbering); long videos are split by frame range across
+    # worker processes. Scores are cached per source, so changing the threshold
+    # never needs another decode
+    VERSION = 1
+    
+    def __init__(self, video_path, frame_count, fps, decode_path=None, threshold=0.35,
+                 min_shot_seconds=0.5, workers=None):
+        self.video_path = video_path
+        self.decode_path = decode_path or video_path
+        self.frame_count = frame_count
+        self.fps = fps
+        self.threshold = threshold
+        self.min_shot_seconds = min_shot_seconds
+        self.workers = max(1, workers or min(4, os.cpu_count() or 1))
+    
+    def cache_path(self):
+        return os.path.join(CACHE_DIR, "scenecuts", f"{source_fingerprint(self.video_path)}.npz")
+    
+    def load_scores(self):
+        try:
+            with np.load(self.cache_path()) as data:
+                if int(data["version"]) == self.VERSION and len(data["scores"]) == self.frame_count:
+                    return data["scores"]
+        except (OSError, KeyError, ValueError):
+            pass
+        return None
+    
+    def save_scores(self, scores):
+        path = self.cache_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, version=self.VERSION, scores=scores)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing scene cut cache: {e}")
+    
+    def compute_scores(self, min_range=3000):
+        ranges = min(self.workers, max(1, self.frame_count // min_range))
+        bounds = np.linspace(0, self.frame_count, ranges + 1).astype(int)
+        if ranges == 1:
+            return _scene_scores_task(self.decode_path, 0, self.frame_count - 1)
+        pool = make_process_pool(ranges)
+        try:
+            futures = [pool.submit(_scene_scores_task, self.decode_path, int(start), int(end) - 1)
+                       for start, end in zip(bounds[:-1], bounds[1:])]
+            return np.concatenate([future.result() for future in futures])
+        finally:
+            pool.shutdown()
+    
+    def find_cuts(self, scores):
+        # Frames that start a new shot: scores over the threshold that are also
+        # the highest within half a minimum shot length either side, so a
+        # flash or a dissolve yields one cut rather than several
+        if len(scores) == 0:
+            return np.zeros(0, dtype=np.int64)
+        radius = max(1, int(self.fps * self.min_shot_seconds / 2))
+        padded = np.pad(scores, radius)
+        local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * radius + 1).max(axis=1)
+        return np.flatnonzero((scores >= self.threshold) & (scores >= local_max))
+    
+    def detect(self):
+        scores = self.load_scores()
+        if scores is None:
+            scores = self.compute_scores()
+            if len(scores) == self.frame_count:
+                self.save_scores(scores)
+        return self.find_cuts(scores)
+
+class ThumbnailStrip:
+    # Evenly spaced tiny RGB thumbnails of a whole video for the filmstrip,
+    # kept as one memory-mapped uint8 array in the cache so later sessions
+    # reuse it. build() fills it in frame order from a single sequential
+    # decode, grab()bing the frames in between, and records how far it got
+    # so an interrupted pass resumes where it stopped. Readers may use
+    # thumbs[:done] while build() runs on another thread
+    VERSION = 1
+    
+    def __init__(self, video_path, frame_count, count=720, size=(96, 54)):
+        self.video_path = video_path
+        self.frame_count = frame_count
+        self.count = max(1, min(count, frame_count))
+        self.size = size
+        self.frames = np.linspace(0, max(0, frame_count - 1), self.count).round().astype(np.int64)
+        self.thumbs = None
+        self.done = 0
+        self.stopped = False
+    
+    def base_path(self):
+        w, h = self.size
+        name = f"{source_fingerprint(self.video_path)}_{self.count}_{w}x{h}"
+        return os.path.join(CACHE_DIR, "thumbnails", name)
+    
+    def open(self):
+        # Map the cached array, or create an empty one
+        base = self.base_path()
+        os.makedirs(os.path.dirname(base), exist_ok=True)
+        shape = (self.count, self.size[1], self.size[0], 3)
+        done = 0
+        try:
+            with open(base + ".json") as f:
+                state = json.load(f)
+            if state["version"] == self.VERSION:
+                done = min(int(state["done"]), self.count)
+            thumbs = np.load(base + ".npy", mmap_mode="r+")
+            if thumbs.shape == shape and thumbs.dtype == np.uint8:
+                self.thumbs = thumbs
+        except (OSError, ValueError, KeyError):
+            pass
+        if self.thumbs is None:
+            done = 0
+            self.thumbs = np.lib.format.open_memmap(base + ".npy", mode="w+", dtype=np.uint8, shape=shape)
+        self.done = done
+        return done
+    
+    def save_progress(self):
+        self.thumbs.flush()
+        path = self.base_path() + ".json"
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"version": self.VERSION, "done": self.done}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Error writing thumbnail progress: {e}")
+    
+    def finished(self):
+        return self.thumbs is not None and self.done >= self.count
+    
+    def nearest(self, fraction):
+        # Thumbnail index closest to a position along the video (0..1)
+        return int(round(min(1.0, max(0.0, fraction)) * (self.count - 1)))
+    
+    def build(self, flush_every=32):
+        if self.thumbs is None:
+            self.open()
+        if self.done >= self.count:
+            return self.done
+        
+        cap = cv2.VideoCapture(self.video_path)
+        reader = FrameReader(cap, max_grab_ahead=self.frame_count, index=KeyframeIndex.load(self.video_path))
+        if self.done:
+            reader.seek(int(self.frames[self.done]))
+        try:
+            for i in range(self.done, self.count):
+                if self.stopped:
+                    break
+                ret, frame = reader.read(int(self.frames[i]))
+                if not ret:
+                    # Container reported more frames than decode; repeat the
+                    # last thumbnail rather than retrying every session
+                    self.thumbs[i:] = self.thumbs[i - 1] if i else 0
+                    self.done = self.count
+                    break
+                small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+                cv2.cvtColor(small, cv2.COLOR_BGR2RGB, dst=self.thumbs[i])
+                self.done = i + 1
+                if self.done % flush_every == 0:
+                    self.save_progress()
+        finally:
+            cap.release()
+            self.save_progress()
+        return self.done
+    
+    def strip_image(self, width):
+        # One row of thumbnails spanning width pixels, each tile showing the
+        # thumbnail nearest its centre; tiles not decoded yet stay grey
+        tile_w, tile_h = self.size
+        tiles = max(1, math.ceil(width / tile_w))
+        image = np.full((tile_h, tiles * tile_w, 3), 64, dtype=np.uint8)
+        for t in range(tiles):
+            i = self.nearest((t + 0.5) / tiles)
+            if i < self.done:
+                image[:, t * tile_w:(t + 1) * tile_w] = self.thumbs[i]
+        return image[:, :width]
+
+class StageTimer:
+    # Per-stage latency histograms for the display, playback and export hot
+    # paths, plus displayed-fps tracking and a few gauges (target fps, dropped
+    # frames). Stages are recorded from the UI thread, the playback decode
+    # thread and the single-pass export thread, so updates take a lock.
+    # Buckets are log-spaced, ten per decade from 10 us to 10 s
+    MIN_MS = 0.01
+    BUCKETS_PER_DECADE = 10
+    BUCKETS = 60
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self.lock:
+            self.stages = {}
+            self.shown = collections.deque(maxlen=120)
+            self.values = {}
+    
+    def record(self, stage, seconds):
+        ms = seconds * 1000.0
+        bucket = int(math.log10(max(ms, self.MIN_MS) / self.MIN_MS) * self.BUCKETS_PER_DECADE)
+        bucket = min(bucket, self.BUCKETS - 1)
+        with self.lock:
+            entry = self.stages.get(stage)
+            if entry is None:
+                entry = self.stages[stage] = [0, 0.0, 0.0, np.zeros(self.BUCKETS, dtype=np.int64)]
+            entry[0] += 1
+            entry[1] += ms
+            entry[2] = max(entry[2], ms)
+            entry[3][bucket] += 1
+    
+    def frame_shown(self):
+        self.shown.append(time.perf_counter())
+    
+    def set(self, name, value):
+        self.values[name] = value
+    
+    def actual_fps(self):
+        # Over the last displayed frames; 0 once nothing was shown for a second
+        shown = list(self.shown)
+        if len(shown) < 2 or time.perf_counter() - shown[-1] > 1.0:
+            return 0.0
+        return (len(shown) - 1) / (shown[-1] - shown[0])
+    
+    def percentile(self, histogram, q):
+        # Upper edge of the bucket holding the q-th sample
+        cumulative = np.cumsum(histogram)
+        bucket = int(np.searchsorted(cumulative, q * cumulative[-1]))
+        return self.MIN_MS * 10 ** ((bucket + 1) / self.BUCKETS_PER_DECADE)
+    
+    def snapshot(self):
+        with self.lock:
+            stages = {name: (count, total, peak, histogram.copy())
+                      for name, (count, total, peak, histogram) in self.stages.items()}
+            values = dict(self.values)
+        edges = self.MIN_MS * 10 ** (np.arange(1, self.BUCKETS + 1) / self.BUCKETS_PER_DECADE)
+        return {
+            "stages": {name: {"count": count, "mean_ms": total / count,
+                              "p50_ms": self.percentile(histogram, 0.5),
+                              "p95_ms": self.percentile(histogram, 0.95), "max_ms": peak,
+                              "histogram": histogram.tolist()}
+                       for name, (count, total, peak, histogram) in stages.items()},
+            "bucket_upper_ms": edges.tolist(),
+            "actual_fps": self.actual_fps(),
+            **values,
+        }
+    
+    def overlay_text(self):
+        snapshot = self.snapshot()
+        lines = [f"{'stage':<13}{'mean':>7}{'p95':>7}{'max':>7} ms"]
+        for name, stats in sorted(snapshot["stages"].items()):
+            lines.append(f"{name:<13}{stats['mean_ms']:>7.2f}{stats['p95_ms']:>7.2f}{stats['max_ms']:>7.1f}")
+        lines.append(f"fps {snapshot['actual_fps']:.1f} / target {snapshot.get('target_fps', 0):.1f}, "
+                     f"dropped {snapshot.get('dropped_frames', 0)}")
+        if "effective_speed" in snapshot:
+            lines.append(f"speed {snapshot['effective_speed']:.2f}x actual")
+        return "\n".join(lines)
+    
+    def dump(self, path, **meta):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"meta": meta, **self.snapshot()}, f, indent=1)
+        os.replace(tmp_path, path)
+
+class FrameReader:
+    # Tracks where the decoder currently is so that forward playback reads
+    # frames sequentially and only falls back to a real seek when needed
+    def __init__(self, cap, max_grab_ahead=16, index=None, timer=None):
+        self.cap = cap
+        self.max_grab_ahead = max_grab_ahead
+        self.index = index
+        self.timer = timer
+        self.position = 0
+        self.seek_count = 0
+        self.frame_buffer = None
+        
+    def seek(self, frame_num):
+        # With a keyframe index, land exactly on the keyframe at or before the
+        # target; read() then decodes forward to the requested frame. The seek
+        # goes by the keyframe's timestamp: OpenCV turns a frame number into a
+        # time at the nominal fps, which misses the GOP on variable frame rates
+        start = time.perf_counter()
+        keyframe = self.index.keyframe_before(frame_num) if self.index is not None else None
+        if keyframe is None:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
+            self.position = frame_num
+        else:
+            self.cap.set(cv2.CAP_PROP_POS_MSEC, self.index.pts[keyframe] * 1000.0)
+            self.position = keyframe
+        self.seek_count += 1
+        if self.timer is not None:
+            self.timer.record("seek", time.perf_counter() - start)
+    
+    def needs_seek(self, frame_num):
+        if self.position is None or frame_num < self.position:
+            return True
+        if frame_num - self.position <= self.max_grab_ahead:
+            return False
+        # Decoding forward is never slower than seeking when no keyframe lies
+        # between the cursor and the target
+        if self.index is not None and len(self.index.keyframes):
+            return self.index.keyframe_before(frame_num) > self.position
+        return True
+    
+    def read(self, frame_num):
+        # Seek only when the target is behind the cursor or too far ahead;
+        # small forward gaps are skipped with grab() which avoids conversion
+        if self.needs_seek(frame_num):
+            self.seek(frame_num)
+        
+        start = time.perf_counter()
+        while self.position < frame_num:
+            if not self.cap.grab():
+                self.position = None
+                return False, None
+            self.position += 1
+        
+        # Decode into the previous frame's buffer instead of a fresh array;
+        # callers must be done with a frame before the next read()
+        ret, frame = self.cap.read(self.frame_buffer)
+        if ret:
+            self.frame_buffer = frame
+        self.position = frame_num + 1 if ret else None
+        if self.timer is not None:
+            self.timer.record("decode", time.perf_counter() - start)
+        return ret, frame
+
+class FrameRenderer:
+    # Turns decoded BGR frames into letterboxed RGB display frames. Resizes
+    # before colour conversion so cvtColor only touches display-sized pixels,
+    # and writes into preallocated buffers. Use one renderer per thread
+    def __init__(self, width, height, timer=None, interpolation=cv2.INTER_LINEAR):
+        self.width = width
+        self.height = height
+        self.timer = timer
+        self.interpolation = interpolation
+        self.source_shape = None
+        self.scaled = None
+        self.box = (0, 0, width, height)
+        self.output = np.zeros((height, width, 3), dtype=np.uint8)
+    
+    def layout(self, source_shape):
+        src_h, src_w = source_shape[:2]
+        scale = min(self.width / src_w, self.height / src_h)
+        w = max(1, min(self.width, round(src_w * scale)))
+        h = max(1, min(self.height, round(src_h * scale)))
+        self.box = ((self.width - w) // 2, (self.height - h) // 2, w, h)
+        self.scaled = np.empty((h, w, 3), dtype=np.uint8)
+        self.source_shape = source_shape
+    
+    def render(self, frame, out=None):
+        if frame.shape != self.source_shape:
+            self.layout(frame.shape)
+        if out is None:
+            out = self.output
+        
+        x, y, w, h = self.box
+        start = time.perf_counter()
+        if (w, h) != (frame.shape[1], frame.shape[0]):
+            frame = cv2.resize(frame, (w, h), dst=self.scaled, interpolation=self.interpolation)
+        resized = time.perf_counter()
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=out[y:y + h, x:x + w])
+        if self.timer is not None:
+            self.timer.record("resize", resized - start)
+            self.timer.record("cvtColor", time.perf_counter() - resized)
+        
+        # Letterbox bars, cleared every time since buffers get recycled
+        out[:y] = 0
+        out[y + h:] = 0
+        out[y:y + h, :x] = 0
+        out[y:y + h, x + w:] = 0
+        return out
+
+class FrameCache:
+    # LRU cache of display-ready frames keyed by frame index. Bounded by a
+    # memory budget instead of an entry count, shared with the prefetch thread.
+    # put() copies the frame, reusing arrays of evicted entries where possible,
+    # so get() copies too: a cached array can be recycled as soon as the lock
+    # is released
+    def __init__(self, budget_mb=256, max_spare=8):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.frames = collections.OrderedDict()
+        self.spare = []
+        self.max_spare = max_spare
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+    
+    def __contains__(self, frame_num):
+        with self.lock:
+            return frame_num in self.frames
+    
+    def get(self, frame_num, out=None):
+        with self.lock:
+            frame = self.frames.get(frame_num)
+            if frame is None:
+                self.misses += 1
+                return None
+            self.frames.move_to_end(frame_num)
+            self.hits += 1
+            if out is None or out.shape != frame.shape:
+                return frame.copy()
+            np.copyto(out, frame)
+            return out
+    
+    def put(self, frame_num, frame):
+        with self.lock:
+            old = self.frames.pop(frame_num, None)
+            if old is not None:
+                self.used_bytes -= old.nbytes
+                self.recycle(old)
+            
+            buffer = None
+            while self.spare and buffer is None:
+                candidate = self.spare.pop()
+                if candidate.shape == frame.shape:
+                    buffer = candidate
+            if buffer is None:
+                buffer = np.empty_like(frame)
+            np.copyto(buffer, frame)
+            
+            self.frames[frame_num] = buffer
+            self.used_bytes += buffer.nbytes
+            self.evict()
+    
+    def recycle(self, frame):
+        if len(self.spare) < self.max_spare:
+            self.spare.append(frame)
+    
+    def evict(self):
+        while self.frames and self.used_bytes > self.budget_bytes:
+            _, frame = self.frames.popitem(last=False)
+            self.used_bytes -= frame.nbytes
+            self.recycle(frame)
+    
+    def set_budget(self, budget_mb):
+        with self.lock:
+            self.budget_bytes = int(budget_mb * 1024 * 1024)
+            self.evict()
+    
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.spare.clear()
+            self.used_bytes = 0
+            self.hits = 0
+            self.misses = 0
+    
+    def stats_text(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            hit_rate = 100.0 * self.hits / lookups if lookups else 0.0
+            return (f"Cache: {len(self.frames)} frames, "
+                    f"{self.used_bytes / 1048576:.0f}/{self.budget_bytes / 1048576:.0f} MB, "
+                    f"{self.hits} hits / {self.misses} misses ({hit_rate:.0f}%)")
+
+class FramePrefetcher:
+    # Fills the frame cache around the playhead once scrubbing pauses, using
+    # its own capture so the UI decoder is never touched off the main thread
+    def __init__(self, video_path, total_frames, cache, display_size=DISPLAY_SIZE,
+                 radius=15, idle_delay=0.15):
+        self.video_path = video_path
+        self.total_frames = total_frames
+        self.cache = cache
+        self.renderer = FrameRenderer(*display_size)
+        self.radius = radius
+        self.idle_delay = idle_delay
+        self.index = None
+        self.center = None
+        self.requested_at = 0.0
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def request(self, center):
+        self.center = center
+        self.requested_at = time.perf_counter()
+        self.wakeup.set()
+    
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+    
+    def run(self):
+        reader = FrameReader(cv2.VideoCapture(self.video_path))
+        try:
+            while not self.stopped:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                
+                # Wait until the playhead has stopped moving for a moment
+                while not self.stopped:
+                    idle = time.perf_counter() - self.requested_at
+                    if idle >= self.idle_delay:
+                        break
+                    time.sleep(self.idle_delay - idle)
+                if self.stopped:
+                    break
+                
+                reader.index = self.index
+                center = self.center
+                first = max(0, center - self.radius)
+                last = min(self.total_frames - 1, center + self.radius)
+                for frame_num in range(first, last + 1):
+                    if self.stopped or self.wakeup.is_set():
+                        break
+                    if frame_num in self.cache:
+                        continue
+                    ret, frame = reader.read(frame_num)
+                    if not ret:
+                        break
+                    self.cache.put(frame_num, self.renderer.render(frame))
+        finally:
+            reader.cap.release()
+
+class FrameRingBuffer:
+    # Bounded queue of display-ready frames shared between the decode thread
+    # (producer) and the Tk main loop (consumer). Slots are allocated once; a
+    # slot handed out by pop_due() goes back to the pool through release()
+    def __init__(self, frame_shape, capacity=32):
+        self.capacity = capacity
+        self.free = [np.zeros(frame_shape, dtype=np.uint8) for _ in range(capacity)]
+        self.frames = collections.deque()
+        self.cond = threading.Condition()
+        self.closed = False
+        self.finished = False
+    
+    def put(self, frame_num, frame):
+        with self.cond:
+            while not self.free and not self.closed:
+                self.cond.wait()
+            if self.closed:
+                return False
+            slot = self.free.pop()
+        
+        np.copyto(slot, frame)
+        with self.cond:
+            if self.closed:
+                return False
+            self.frames.append((frame_num, slot))
+            return True
+    
+    def release(self, slot):
+        with self.cond:
+            self.free.append(slot)
+            self.cond.notify_all()
+    
+    def pop_due(self, target_frame, forward=True):
+        # Return the newest frame that is due at target_frame, dropping any
+        # older ones that the display could not keep up with
+        latest = None
+        dropped = 0
+        with self.cond:
+            while self.frames:
+                frame_num = self.frames[0][0]
+                due = frame_num <= target_frame if forward else frame_num >= target_frame
+                if not due:
+                    break
+                if latest is not None:
+                    self.free.append(latest[1])
+                    dropped += 1
+                latest = self.frames.popleft()
+            self.cond.notify_all()
+        return latest, dropped
+    
+    def exhausted(self):
+        with self.cond:
+            return self.finished and not self.frames
+    
+    def mark_finished(self):
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+    
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.free.extend(slot for _, slot in self.frames)
+            self.frames.clear()
+            self.cond.notify_all()
+
+class ReverseChunkDecoder:
+    # Reverse playback without a backward seek per frame: decode one chunk
+    # (about a GOP) forward into memory, hand it out in reverse order, and
+    # decode the previous chunk on a helper thread in the meantime. At most
+    # two chunks are held at once, only frames that will be shown are
+    # converted and kept, and their buffers are reused for later chunks
+    def __init__(self, video_path, start_frame, step, display_size=DISPLAY_SIZE,
+                 chunk_size=48, min_chunk_frames=8, index=None, timer=None, target_frame=None):
+        self.video_path = video_path
+        self.index = index
+        self.timer = timer
+        self.target_frame = target_frame
+        self.start_frame = start_frame
+        self.step = abs(step)
+        self.renderer = FrameRenderer(*display_size, timer=timer)
+        self.frame_shape = (display_size[1], display_size[0], 3)
+        self.spare = collections.deque()
+        self.span = max(chunk_size, self.step * min_chunk_frames)
+        self.reader = None
+    
+    def decode_chunk(self, first, last):
+        # Runs on the prefetch thread, which owns its own capture
+        if self.reader is None:
+            self.reader = FrameReader(cv2.VideoCapture(self.video_path), index=self.index, timer=self.timer)
+        cap = self.reader.cap
+        
+        self.reader.seek(first)
+        frames = []
+        for frame_num in range(self.reader.position, last + 1):
+            if not cap.grab():
+                break
+            if frame_num >= first and (self.start_frame - frame_num) % self.step == 0:
+                ret, frame = cap.retrieve(self.reader.frame_buffer)
+                if not ret:
+                    break
+                self.reader.frame_buffer = frame
+                buffer = self.spare.pop() if self.spare else np.zeros(self.frame_shape, dtype=np.uint8)
+                frames.append((frame_num, self.renderer.render(frame, buffer)))
+        self.reader.position = None
+        return frames
+    
+    def chunk_ranges(self):
+        last = self.start_frame - self.step
+        while last >= 0:
+            # Behind the wall clock: start the chunk at the frame due now
+            # instead of decoding frames that would only be dropped
+            if self.target_frame is not None:
+                due = self.target_frame()
+                if due < last:
+                    last = self.start_frame - -(-(self.start_frame - due) // self.step) * self.step
+                    if last < 0:
+                        return
+            first = max(0, last - self.span + 1)
+            # Start chunks on a keyframe so no decoded frame is thrown away
+            if self.index is not None:
+                keyframe = self.index.keyframe_before(first)
+                if keyframe is not None and first - keyframe <= self.span:
+                    first = keyframe
+            yield first, last
+            last = first - 1
+    
+    def frames(self):
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        try:
+            ranges = self.chunk_ranges()
+            pending = None
+            first_range = next(ranges, None)
+            if first_range is not None:
+                pending = pool.submit(self.decode_chunk, *first_range)
+            while pending is not None:
+                chunk = pending.result()
+                next_range = next(ranges, None)
+                pending = pool.submit(self.decode_chunk, *next_range) if next_range else None
+                for item in reversed(chunk):
+                    yield item
+                # The consumer copies each frame before asking for the next one
+                self.spare.extend(frame for _, frame in chunk)
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+            if self.reader is not None:
+                self.reader.cap.release()
+
+class PlaybackEngine:
+    # Decodes frames ahead of the playhead on a background thread. Nothing in
+    # here touches Tk; the UI pulls frames with pop_frame() from an after() timer
+    def __init__(self, video_path, start_frame, total_frames, fps, speed,
+                 display_size=DISPLAY_SIZE, buffer_size=32, index=None, timer=None):
+        self.video_path = video_path
+        self.index = index
+        self.timer = timer
+        self.start_frame = start_frame
+        self.total_frames = total_frames
+        self.fps = fps
+        self.speed = speed
+        self.display_size = display_size
+        self.buffer = FrameRingBuffer((display_size[1], display_size[0], 3), buffer_size)
+        self.start_time = None
+        self.dropped_frames = 0
+        self.skipped_frames = 0
+        self.shown_frame = start_frame
+        self.thread = threading.Thread(target=self.decode_loop, daemon=True)
+    
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.thread.start()
+    
+    def stop(self):
+        self.buffer.close()
+    
+    def target_frame(self):
+        # Playhead position derived from wall clock time, so pacing does not
+        # drift with decode or render cost
+        elapsed = time.perf_counter() - self.start_time
+        return self.start_frame + int(elapsed * self.fps * self.speed)
+    
+    def pop_frame(self):
+        item, dropped = self.buffer.pop_due(self.target_frame(), self.speed > 0)
+        self.dropped_frames += dropped
+        if item is not None:
+            self.shown_frame = item[0]
+        return item
+    
+    def effective_speed(self):
+        # Source frames actually covered per second of playback, in units of
+        # real time; equals speed when decoding keeps up
+        elapsed = time.perf_counter() - self.start_time
+        if elapsed <= 0:
+            return 0.0
+        return (self.shown_frame - self.start_frame) / (elapsed * self.fps)
+    
+    def release(self, frame):
+        self.buffer.release(frame)
+    
+    def finished(self):
+        return self.buffer.exhausted()
+    
+    def decode_loop(self):
+        if self.speed < 0:
+            frames = ReverseChunkDecoder(self.video_path, self.start_frame, self.speed,
+                                         self.display_size, index=self.index, timer=self.timer,
+                                         target_frame=self.target_frame).frames()
+        else:
+            frames = self.forward_frames()
+        try:
+            for frame_num, frame in frames:
+                if not self.buffer.put(frame_num, frame):
+                    return
+        finally:
+            frames.close()
+            self.buffer.mark_finished()
+    
+    def forward_frames(self):
+        # Only frames that will be shown are retrieved and rendered: the reader
+        # grab()s through the ones in between, and when decoding falls behind
+        # the wall clock the next frame jumps ahead to the one due now
+        cap = cv2.VideoCapture(self.video_path)
+        reader = FrameReader(cap, max_grab_ahead=max(16, 4 * self.speed), index=self.index, timer=self.timer)
+        renderer = FrameRenderer(*self.display_size, timer=self.timer)
+        frame_num = self.start_frame + self.speed
+        try:
+            while frame_num < self.total_frames:
+                due = self.target_frame()
+                if frame_num < due:
+                    steps = -(-(due - self.start_frame) // self.speed)
+                    self.skipped_frames += (self.start_frame + steps * self.speed - frame_num) // self.speed
+                    frame_num = self.start_frame + steps * self.speed
+                    if frame_num >= self.total_frames:
+                        break
+                ret, frame = reader.read(frame_num)
+                if not ret:
+                    break
+                yield frame_num, renderer.render(frame)
+                frame_num += self.speed
+        finally:
+            cap.release()
+
+class ExportCancelled(Exception):
+    pass
+
+def pipelined_frames(reader, frame_numbers, frame_size, depth=8, timer=None):
+    # Decode stage of an export: a thread reads (and, for downscaled output,
+    # resizes) frames into a bounded queue while the caller encodes. Frames are
+    # copied out of the reader's reused buffer before crossing threads
+    frames = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    failure = []
+    
+    def offer(item):
+        while not stop.is_set():
+            try:
+                frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+    
+    def decode():
+        try:
+            for frame_num in frame_numbers:
+                start = time.perf_counter()
+                ret, frame = reader.read(frame_num)
+                if not ret:
+                    break
+                decoded = time.perf_counter()
+                if (frame.shape[1], frame.shape[0]) != tuple(frame_size):
+                    frame = cv2.resize(frame, tuple(frame_size), interpolation=cv2.INTER_AREA)
+                else:
+                    frame = frame.copy()
+                if timer is not None:
+                    timer.record("export_decode", decoded - start)
+                    timer.record("export_resize", time.perf_counter() - decoded)
+                if not offer((frame_num, frame)):
+                    return
+        except Exception as e:
+            failure.append(e)
+        offer(None)
+    
+    thread = threading.Thread(target=decode, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = frames.get()
+            if item is None:
+                break
+            yield item
+        if failure:
+            raise failure[0]
+    finally:
+        stop.set()
+        thread.join()
+
+def export_clip(reader, start_frame, end_frame, output_path, fps, frame_size, fourcc="mp4v",
+                on_progress=None, should_stop=None):
+    out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, tuple(frame_size))
+    if not out.isOpened():
+        raise RuntimeError(f"Could not open video writer for {os.path.basename(output_path)}")
+    
+    written = 0
+    try:
+        for _, frame in pipelined_frames(reader, range(start_frame, end_frame + 1), frame_size):
+            if should_stop is not None and should_stop():
+                raise ExportCancelled()
+            out.write(frame)
+            written += 1
+            if on_progress is not None:
+                on_progress(1)
+    finally:
+        out.release()
+    return written
+
+# Per-process state of export workers: each worker opens a source once and
+# keeps decoding from where its previous clip of that source ended
+_export_readers = collections.OrderedDict()
+
+def _export_reader_for(video_path, max_open=2):
+    reader = _export_readers.get(video_path)
+    if reader is None:
+        while len(_export_readers) >= max_open:
+            _, old = _export_readers.popitem(last=False)
+            old.cap.release()
+        reader = FrameReader(cv2.VideoCapture(video_path), index=KeyframeIndex.load(video_path))
+        _export_readers[video_path] = reader
+    _export_readers.move_to_end(video_path)
+    return reader
+
+def _run_clip_task(clip_name, write, progress=None, cancel=None, report_every=25):
+    # Shared body of per-clip worker tasks; write(on_progress, should_stop)
+    # returns the frames written. progress and cancel are
+    # multiprocessing.Manager proxies (or None); both are only touched every
+    # few frames to keep IPC off the hot path
+    pending = [0]
+    
+    def on_progress(count):
+        pending[0] += count
+        if progress is not None and pending[0] >= report_every:
+            progress.put(pending[0])
+            pending[0] = 0
+    
+    def should_stop():
+        return cancel is not None and pending[0] == 0 and cancel.is_set()
+    
+    try:
+        if cancel is not None and cancel.is_set():
+            return clip_name, 0, "Cancelled"
+        return clip_name, write(on_progress, should_stop), None
+    except ExportCancelled:
+        return clip_name, 0, "Cancelled"
+    except Exception as e:
+        return clip_name, 0, str(e)
+    finally:
+        if progress is not None and pending[0]:
+            progress.put(pending[0])
+
+def _export_clip_task(video_path, clip_name, start_frame, end_frame, output_path, fps, frame_size,
+                      progress=None, cancel=None):
+    def write(on_progress, should_stop):
+        return export_clip(_export_reader_for(video_path), start_frame, end_frame, output_path, fps,
+                           frame_size, on_progress=on_progress, should_stop=should_stop)
+    return _run_clip_task(clip_name, write, progress, cancel)
+
+DATASET_FORMATS = {"NumPy": ".npy", "JPEG": ".jpg", "PNG": ".png"}
+
+def export_dataset_clip(reader, start_frame, end_frame, output_path, frame_size, stride=1, fmt="NumPy",
+                        on_progress=None, should_stop=None):
+    # Every stride-th frame of a clip as letterboxed RGB at frame_size, written
+    # straight to training data: one (frames, height, width, 3) uint8 .npy
+    # filled through a memory map, or a directory of numbered images. Skips
+    # the encode/decode round trip of exporting a video first
+    frame_numbers = range(start_frame, end_frame + 1, stride)
+    width, height = frame_size
+    renderer = FrameRenderer(width, height, interpolation=cv2.INTER_AREA)
+    array = None
+    if fmt == "NumPy":
+        array = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.uint8,
+                                          shape=(len(frame_numbers), height, width, 3))
+    else:
+        # A partial folder left by an interrupted run may hold extra frames
+        if os.path.isdir(output_path):
+            shutil.rmtree(output_path)
+        os.makedirs(output_path)
+    
+    written = 0
+    try:
+        for frame_num in frame_numbers:
+            if should_stop is not None and should_stop():
+                raise ExportCancelled()
+            ret, frame = reader.read(frame_num)
+            if not ret:
+                break
+            if array is not None:
+                renderer.render(frame, out=array[written])
+            else:
+                image = cv2.cvtColor(renderer.render(frame), cv2.COLOR_RGB2BGR)
+                image_path = os.path.join(output_path, f"{written:06d}{DATASET_FORMATS[fmt]}")
+                if not cv2.imwrite(image_path, image):
+                    raise RuntimeError(f"Could not write {os.path.basename(image_path)}")
+            written += 1
+            if on_progress is not None:
+                on_progress(1)
+    finally:
+        if array is not None:
+            array.flush()
+            del array
+    
+    if fmt == "NumPy" and 0 < written < len(frame_numbers):
+        # The source ended early: rewrite without the unfilled tail
+        truncated = np.load(output_path, mmap_mode="r")[:written].copy()
+        np.save(output_path, truncated)
+    return written
+
+def _dataset_clip_task(video_path, clip_name, start_frame, end_frame, output_path, frame_size, stride, fmt,
+                       progress=None, cancel=None):
+    def write(on_progress, should_stop):
+        return export_dataset_clip(_export_reader_for(video_path), start_frame, end_frame, output_path,
+                                   frame_size, stride, fmt, on_progress=on_progress, should_stop=should_stop)
+    return _run_clip_task(clip_name, write, progress, cancel)
+
+def export_clips_single_pass(reader, jobs, fps, frame_size, on_result, fourcc="mp4v",
+                             on_progress=None, should_stop=None, timer=None):
+    # Decode the union of all clip ranges once, in order, and write each frame to
+    # every clip whose range covers it. Gaps between ranges are skipped by the
+    # reader (grab or seek), so cost follows covered footage, not clip lengths
+    jobs = sorted(jobs, key=lambda job: (job[1], job[2]))
+    
+    def covered_frames():
+        next_frame = 0
+        for _, start_frame, end_frame, _ in jobs:
+            yield from range(max(next_frame, start_frame), end_frame + 1)
+            next_frame = max(next_frame, end_frame + 1)
+    
+    active = []
+    next_job = 0
+    cancelled = False
+    error = None
+    try:
+        for frame_num, frame in pipelined_frames(reader, covered_frames(), frame_size, timer=timer):
+            if should_stop is not None and should_stop():
+                cancelled = True
+                break
+            while next_job < len(jobs) and jobs[next_job][1] <= frame_num:
+                clip_name, start_frame, end_frame, output_path = jobs[next_job]
+                next_job += 1
+                out = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, tuple(frame_size))
+                if out.isOpened():
+                    active.append([end_frame, clip_name, out, 0])
+                else:
+                    on_result((clip_name, 0, f"Could not open video writer for {os.path.basename(output_path)}"))
+            
+            start = time.perf_counter()
+            for entry in active:
+                entry[2].write(frame)
+                entry[3] += 1
+                if on_progress is not None:
+                    on_progress(1)
+            if timer is not None:
+                timer.record("export_encode", time.perf_counter() - start)
+            
+            for entry in [entry for entry in active if entry[0] <= frame_num]:
+                active.remove(entry)
+                entry[2].release()
+                on_result((entry[1], entry[3], None))
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        # Cancelled, failed, or the source ended early: close what is open and
+        # report the rest. Truncated clips are only kept when the source ended,
+        # so a clip cut short by an error is discarded, not committed
+        if cancelled:
+            error = "Cancelled"
+        for end_frame, clip_name, out, written in active:
+            out.release()
+            on_result((clip_name, written, error))
+        for clip_name, _, _, _ in jobs[next_job:]:
+            on_result((clip_name, 0, error or "Source ended before clip start"))
+
+class SinglePassExporter:
+    # Same interface as ParallelExporter, but one background thread makes a
+    # single sequential pass over the source for all clips
+    def __init__(self, video_path, fps, frame_size, index=None, timer=None):
+        self.video_path = video_path
+        self.fps = fps
+        self.frame_size = frame_size
+        self.index = index
+        self.timer = timer
+        self.workers = 1
+        self.results = queue.Queue()
+        self.done_frames = 0
+        self.cancel_event = threading.Event()
+        self.thread = None
+    
+    def submit(self, jobs):
+        self.thread = threading.Thread(target=self.run, args=(list(jobs),), daemon=True)
+        self.thread.start()
+    
+    def count_progress(self, count):
+        self.done_frames += count
+    
+    def run(self, jobs):
+        reader = FrameReader(cv2.VideoCapture(self.video_path), index=self.index)
+        try:
+            export_clips_single_pass(reader, jobs, self.fps, self.frame_size, self.results.put,
+                                     on_progress=self.count_progress, should_stop=self.cancel_event.is_set,
+                                     timer=self.timer)
+        except Exception as e:
+            self.results.put((None, 0, str(e)))
+        finally:
+            reader.cap.release()
+    
+    def poll(self):
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                return results
+    
+    def frames_done(self):
+        return self.done_frames
+    
+    def finished(self):
+        return self.thread is None or (not self.thread.is_alive() and self.results.empty())
+    
+    def cancel(self):
+        self.cancel_event.set()
+    
+    def shutdown(self, cancel=False):
+        if cancel:
+            self.cancel()
+
+class PoolExporter:
+    # Shared bookkeeping for exporters that run one future per clip; results are
+    # collected with poll() so the caller never blocks on the pool
+    def __init__(self, pool, workers, owns_pool=True):
+        self.pool = pool
+        self.workers = workers
+        self.owns_pool = owns_pool
+        self.pending = {}
+        self.done_frames = 0
+    
+    def poll(self):
+        done = [future for future in self.pending if future.done()]
+        results = []
+        for future in done:
+            clip_name = self.pending.pop(future)
+            try:
+                result = future.result()
+            except concurrent.futures.CancelledError:
+                result = (clip_name, 0, "Cancelled")
+            except Exception as e:
+                result = (clip_name, 0, str(e))
+            self.done_frames += result[1]
+            results.append(result)
+        return results
+    
+    def frames_done(self):
+        # Coarse: frames are counted as each clip completes
+        return self.done_frames
+    
+    def finished(self):
+        return not self.pending
+    
+    def cancel(self):
+        for future in self.pending:
+            future.cancel()
+    
+    def shutdown(self, cancel=False):
+        if cancel:
+            self.cancel()
+        if self.owns_pool:
+            self.pool.shutdown(wait=False, cancel_futures=cancel)
+
+def make_process_pool(workers):
+    # spawn rather than fork: the parent has live decoder threads
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+class ParallelExporter(PoolExporter):
+    # Re-encodes clips on a process pool. Jobs are queued in start-frame order so
+    # each worker's capture mostly moves forward. The pool may be shared between
+    # several sources (batch export); workers load the keyframe index sidecar.
+    # With its own pool it also gets live frame progress and cancellation of
+    # running clips through a Manager
+    def __init__(self, video_path, fps, frame_size, workers=None, pool=None):
+        self.video_path = video_path
+        self.fps = fps
+        self.frame_size = frame_size
+        self.manager = None
+        self.progress = None
+        self.cancel_event = None
+        if pool is None:
+            workers = max(1, workers or os.cpu_count() or 1)
+            super().__init__(make_process_pool(workers), workers)
+            self.manager = multiprocessing.get_context("spawn").Manager()
+            self.progress = self.manager.Queue()
+            self.cancel_event = self.manager.Event()
+        else:
+            super().__init__(pool, pool._max_workers, owns_pool=False)
+        self.reported_frames = 0
+    
+    def submit(self, jobs):
+        # jobs: (clip_name, start_frame, end_frame, output_path)
+        for clip_name, start_frame, end_frame, output_path in sorted(jobs, key=lambda job: job[1]):
+            future = self.pool.submit(_export_clip_task, self.video_path, clip_name, start_frame, end_frame,
+                                      output_path, self.fps, self.frame_size, self.progress, self.cancel_event)
+            self.pending[future] = clip_name
+    
+    def frames_done(self):
+        if self.progress is None:
+            return super().frames_done()
+        while self.manager is not None:
+            try:
+                self.reported_frames += self.progress.get_nowait()
+            except queue.Empty:
+                break
+        return self.reported_frames
+    
+    def cancel(self):
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        super().cancel()
+    
+    def shutdown(self, cancel=False):
+        super().shutdown(cancel)
+        if self.manager is not None and not self.pending:
+            self.frames_done()
+            self.manager.shutdown()
+            self.manager = None
+
+class DatasetExporter(ParallelExporter):
+    # Writes clips as training data (see export_dataset_clip) on the same
+    # process pool, progress and cancellation machinery as re-encoding
+    def __init__(self, video_path, fps, frame_size, stride=1, fmt="NumPy", workers=None, pool=None):
+        super().__init__(video_path, fps, frame_size, workers=workers, pool=pool)
+        self.stride = stride
+        self.fmt = fmt
+    
+    def submit(self, jobs):
+        for clip_name, start_frame, end_frame, output_path in sorted(jobs, key=lambda job: job[1]):
+            future = self.pool.submit(_dataset_clip_task, self.video_path, clip_name, start_frame, end_frame,
+                                      output_path, self.frame_size, self.stride, self.fmt,
+                                      self.progress, self.cancel_event)
+            self.pending[future] = clip_name
+
+class StreamCopyExporter(PoolExporter):
+    # Cuts clips by remuxing compressed packets with a local ffmpeg binary, so
+    # export is I/O-bound and keeps audio and source quality. Plain copy snaps
+    # the start to the keyframe before it; smart cut re-encodes only the
+    # partial GOPs at either edge and stream-copies everything in between.
+    # Edge encodes must match the source streams (profile, level, pixel
+    # format, SAR, timebase, audio format) or the joins are out of spec; when
+    # that can't be arranged the whole clip is re-encoded instead
+    ENCODERS = {"h264": "libx264", "hevc": "libx265", "mpeg4": "mpeg4", "vp9": "libvpx-vp9"}
+    AUDIO_ENCODERS = {"aac": "aac", "mp3": "libmp3lame", "ac3": "ac3", "opus": "libopus",
+                      "vorbis": "libvorbis", "flac": "flac"}
+    PROFILES = {
+        "h264": {"Constrained Baseline": "baseline", "Baseline": "baseline", "Main": "main",
+                 "High": "high", "High 10": "high10", "High 4:2:2": "high422",
+                 "High 4:4:4 Predictive": "high444"},
+        "hevc": {"Main": "main", "Main 10": "main10", "Rext": None},
+    }
+    
+    def __init__(self, video_path, fps, index=None, smart_cut=False, workers=None):
+        if not shutil.which("ffmpeg"):
+            raise RuntimeError("ffmpeg was not found on PATH")
+        self.video_path = video_path
+        self.fps = fps
+        self.index = index
+        self.encoder = None
+        self.edge_args = None
+        self.timescale = None
+        if smart_cut:
+            self.probe_source()
+        self.processes = set()
+        self.cancelled = False
+        self.lock = threading.Lock()
+        workers = max(1, workers or min(4, os.cpu_count() or 1))
+        super().__init__(concurrent.futures.ThreadPoolExecutor(max_workers=workers), workers)
+    
+    def probe_source(self):
+        # Sets encoder (the source video codec can be re-encoded at all) and
+        # edge_args (encoder arguments matching every source stream, or None)
+        if not shutil.which("ffprobe"):
+            return
+        cmd = ["ffprobe", "-v", "error", "-show_entries",
+               "stream=codec_type,codec_name,profile,level,pix_fmt,sample_aspect_ratio,time_base,"
+               "sample_rate,channels,bit_rate", "-of", "json", self.video_path]
+        try:
+            output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+            streams = json.loads(output).get("streams", [])
+        except (OSError, subprocess.CalledProcessError, ValueError):
+            return
+        video = next((stream for stream in streams if stream.get("codec_type") == "video"), None)
+        audio = next((stream for stream in streams if stream.get("codec_type") == "audio"), None)
+        if video is None:
+            return
+        self.encoder = self.ENCODERS.get(video.get("codec_name"))
+        if self.encoder is not None:
+            self.edge_args = self.matching_args(video, audio)
+    
+    def matching_args(self, video, audio):
+        codec = video["codec_name"]
+        args = ["-c:v", self.encoder, "-preset", "fast", "-crf", "18"]
+        if video.get("pix_fmt"):
+            args += ["-pix_fmt", video["pix_fmt"]]
+        if codec in self.PROFILES:
+            profile = self.PROFILES[codec].get(video.get("profile"))
+            level = video.get("level")
+            if profile is None or not isinstance(level, int) or level <= 0:
+                return None
+            args += ["-profile:v", profile]
+            if codec == "h264":
+                args += ["-level", f"{level / 10:g}"]
+            else:
+                # ffprobe reports HEVC levels times 30
+                args += ["-x265-params", f"level-idc={level / 30:g}"]
+        sar = video.get("sample_aspect_ratio")
+        if sar and sar not in ("N/A", "0:1"):
+            args += ["-vf", f"setsar={sar.replace(':', '/')}"]
+        time_base = video.get("time_base", "")
+        if time_base.startswith("1/"):
+            self.timescale = time_base[2:]
+        
+        if audio is not None:
+            audio_encoder = self.AUDIO_ENCODERS.get(audio.get("codec_name"))
+            if audio_encoder is None or not audio.get("sample_rate") or not audio.get("channels"):
+                return None
+            args += ["-c:a", audio_encoder, "-ar", str(audio["sample_rate"]), "-ac", str(audio["channels"])]
+            if audio.get("bit_rate", "N/A") != "N/A":
+                args += ["-b:a", str(audio["bit_rate"])]
+        return args
+    
+    def submit(self, jobs):
+        for clip_name, start_frame, end_frame, output_path in sorted(jobs, key=lambda job: job[1]):
+            future = self.pool.submit(self.export, clip_name, start_frame, end_frame, output_path)
+            self.pending[future] = clip_name
+    
+    def run_process(self, cmd):
+        with self.lock:
+            if self.cancelled:
+                raise ExportCancelled()
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            self.processes.add(process)
+        try:
+            stdout, stderr = process.communicate()
+        finally:
+            with self.lock:
+                self.processes.discard(process)
+        if self.cancelled:
+            raise ExportCancelled()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd, stdout, stderr)
+    
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            for process in self.processes:
+                process.kill()
+        super().cancel()
+    
+    def frame_time(self, frame_num):
+        if self.index is not None:
+            return self.index.timestamp(frame_num, self.fps)
+        return frame_num / self.fps
+    
+    def export(self, clip_name, start_frame, end_frame, output_path):
+        try:
+            has_keyframes = self.index is not None and len(self.index.keyframes) > 0
+            if self.encoder and self.edge_args is None:
+                # Edges could not be matched to the source: one clean encode
+                self.encode_segment(start_frame, end_frame + 1, output_path)
+                return clip_name, end_frame - start_frame + 1, None
+            if self.encoder and has_keyframes:
+                first_key = self.index.keyframe_after(start_frame - 1)
+                if first_key is None or first_key > end_frame:
+                    # The whole clip sits inside one GOP
+                    self.encode_segment(start_frame, end_frame + 1, output_path)
+                else:
+                    last_key = self.index.keyframe_before(end_frame)
+                    self.smart_cut(start_frame, end_frame, first_key, last_key, output_path)
+                return clip_name, end_frame - start_frame + 1, None
+            
+            # Keyframe-snapped copy: ffmpeg's input seek lands on the keyframe
+            # at or before the start
+            start_key = self.index.keyframe_before(start_frame) if has_keyframes else start_frame
+            self.copy_segment(start_key, end_frame + 1, output_path)
+            return clip_name, end_frame - start_key + 1, None
+        except ExportCancelled:
+            return clip_name, 0, "Cancelled"
+        except subprocess.CalledProcessError as e:
+            lines = e.stderr.decode(errors="replace").strip().splitlines() if e.stderr else []
+            return clip_name, 0, lines[-1] if lines else str(e)
+        except OSError as e:
+            return clip_name, 0, str(e)
+    
+    def run_ffmpeg(self, first_frame, stop_frame, output_path, codec_args):
+        start = self.frame_time(first_frame)
+        duration = self.frame_time(stop_frame) - start
+        cmd = ["ffmpeg", "-y", "-v", "error", "-ss", f"{start:.6f}", "-i", self.video_path,
+               "-t", f"{duration:.6f}", "-map", "0:v:0", "-map", "0:a?"] + codec_args + [output_path]
+        self.run_process(cmd)
+    
+    def copy_segment(self, first_frame, stop_frame, output_path):
+        self.run_ffmpeg(first_frame, stop_frame, output_path,
+                        ["-c", "copy", "-avoid_negative_ts", "make_zero"])
+    
+    def encode_segment(self, first_frame, stop_frame, output_path):
+        args = self.edge_args or ["-c:v", self.encoder, "-preset", "fast", "-crf", "18", "-c:a", "aac"]
+        if self.timescale and os.path.splitext(output_path)[1].lower() in (".mp4", ".mov", ".m4v"):
+            # MP4/MOV only: keep the source track timebase so copied packets line up
+            args = args + ["-video_track_timescale", self.timescale]
+        self.run_ffmpeg(first_frame, stop_frame, output_path, args)
+    
+    def smart_cut(self, start_frame, end_frame, first_key, last_key, output_path):
+        # [start, first_key) re-encoded, [first_key, last_key) copied,
+        # [last_key, end] re-encoded, then joined with the concat demuxer
+        ext = os.path.splitext(output_path)[1]
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(output_path) or None) as tmp_dir:
+            segments = []
+            if start_frame < first_key:
+                segments.append((self.encode_segment, start_frame, first_key))
+            if first_key < last_key:
+                segments.append((self.copy_segment, first_key, last_key))
+            segments.append((self.encode_segment, last_key, end_frame + 1))
+            
+            paths = []
+            for i, (write_segment, first_frame, stop_frame) in enumerate(segments):
+                path = os.path.join(tmp_dir, f"part_{i}{ext}")
+                write_segment(first_frame, stop_frame, path)
+                paths.append(path)
+            
+            list_path = os.path.join(tmp_dir, "parts.txt")
+            with open(list_path, "w") as f:
+                for path in paths:
+                    f.write(f"file '{path}'\n")
+            cmd = ["ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0", "-i", list_path,
+                   "-c", "copy", output_path]
+            self.run_process(cmd)
+
+EXPORT_MODES = ["Parallel re-encode", "Single pass", "Stream copy", "Smart cut"]
+
+def make_exporter(mode, video_path, fps, frame_size, job_count, workers=None, index=None, pool=None,
+                  timer=None):
+    # Only the single-pass exporter runs in this process, so only it reports
+    # per-stage timings
+    if mode == "Single pass":
+        return SinglePassExporter(video_path, fps, frame_size, index=index, timer=timer)
+    if mode in ("Stream copy", "Smart cut"):
+        return StreamCopyExporter(video_path, fps, index=index, smart_cut=mode == "Smart cut",
+                                  workers=workers)
+    return ParallelExporter(video_path, fps, frame_size,
+                            workers=min(workers or job_count, job_count), pool=pool)
+
+def partial_path(output_path):
+    # Keep the extension so writers still pick the right container
+    directory, name = os.path.split(output_path)
+    root, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{root}.partial{ext}")
+
+class ExportManifest:
+    # Records what each exported clip was made from (source hash, frame range,
+    # encoder settings) so a re-run only redoes clips that are missing,
+    # incomplete or changed. Rewritten atomically after every finished clip
+    FILENAME = "export_manifest.json"
+    
+    def __init__(self, save_dir):
+        self.path = os.path.join(save_dir, self.FILENAME)
+        self.entries = {}
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f).get("clips", {})
+        except (OSError, ValueError):
+            pass
+    
+    @staticmethod
+    def measure(output_path):
+        # (bytes, files) of an output file, or summed over an image folder
+        if os.path.isdir(output_path):
+            with os.scandir(output_path) as entries:
+                sizes = [entry.stat().st_size for entry in entries if entry.is_file()]
+            return sum(sizes), len(sizes)
+        return os.path.getsize(output_path), 1
+    
+    def is_current(self, key, record, output_path):
+        entry = self.entries.get(key)
+        if entry is None or entry.get("record") != record:
+            return False
+        try:
+            size, files = self.measure(output_path)
+        except OSError:
+            return False
+        return size == entry.get("size") and files == entry.get("files", 1)
+    
+    def mark_done(self, key, record, output_path):
+        size, files = self.measure(output_path)
+        self.entries[key] = {
+            "record": record,
+            "size": size,
+            "files": files,
+            "exported_at": datetime.now().isoformat(timespec="seconds")
+        }
+        self.save()
+    
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": 1, "clips": self.entries}, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+class ExportSession:
+    # One export run: checks clips against the manifest, hands the rest to an
+    # exporter writing to partial files, and renames each finished clip into
+    # place before recording it. Nothing here touches Tk
+    def __init__(self, video_path, save_dir, fps, frame_size, mode=EXPORT_MODES[0],
+                 workers=None, index=None, pool=None, scale=1.0, timer=None):
+        self.video_path = video_path
+        self.pool = pool
+        self.timer = timer
+        self.save_dir = save_dir
+        self.fps = fps
+        self.mode = mode
+        # Stream copy never decodes, so it cannot downscale
+        self.scale = 1.0 if mode in ("Stream copy", "Smart cut") else scale
+        self.frame_size = (max(2, int(frame_size[0] * self.scale) // 2 * 2),
+                           max(2, int(frame_size[1] * self.scale) // 2 * 2))
+        self.workers = workers
+        self.index = index
+        self.manifest = ExportManifest(save_dir)
+        self.source_hash = source_fingerprint(video_path)
+        self.targets = {}
+        self.exporter = None
+        self.start_time = None
+    
+    @property
+    def total_frames(self):
+        return sum(end_frame - start_frame + 1 for start_frame, end_frame, _, _ in self.targets.values())
+    
+    def record(self, start_frame, end_frame):
+        return {
+            "source": self.source_hash,
+            "start_frame": int(start_frame),
+            "end_frame": int(end_frame),
+            "settings": {"mode": self.mode, "fps": round(self.fps, 6), "frame_size": list(self.frame_size)}
+        }
+    
+    def plan(self, clips):
+        # clips: (clip_name, start_frame, end_frame); returns the names skipped
+        # because their output is already up to date
+        up_to_date = []
+        for clip_name, start_frame, end_frame in clips:
+            output_path = self.output_path(clip_name)
+            record = self.record(start_frame, end_frame)
+            if self.manifest.is_current(self.manifest_key(clip_name), record, output_path):
+                up_to_date.append(clip_name)
+                continue
+            self.targets[clip_name] = (start_frame, end_frame, output_path, record)
+        return up_to_date
+    
+    def output_path(self, clip_name):
+        return os.path.join(self.save_dir, clip_name)
+    
+    def manifest_key(self, clip_name):
+        return clip_name
+    
+    def jobs(self):
+        return [(clip_name, start_frame, end_frame, partial_path(output_path))
+                for clip_name, (start_frame, end_frame, output_path, _) in self.targets.items()]
+    
+    def make_exporter(self, job_count):
+        return make_exporter(self.mode, self.video_path, self.fps, self.frame_size, job_count,
+                             workers=self.workers, index=self.index, pool=self.pool, timer=self.timer)
+    
+    def start(self):
+        jobs = self.jobs()
+        self.exporter = self.make_exporter(len(jobs))
+        self.exporter.submit(jobs)
+        self.start_time = time.perf_counter()
+    
+    def progress(self):
+        # (frames done, frames per second, seconds remaining or None)
+        done = self.exporter.frames_done() if self.exporter is not None else 0
+        elapsed = time.perf_counter() - self.start_time if self.start_time else 0.0
+        fps = done / elapsed if elapsed > 0 else 0.0
+        eta = (self.total_frames - done) / fps if fps > 0 else None
+        return done, fps, eta
+    
+    def cancel(self):
+        if self.exporter is not None:
+            self.exporter.cancel()
+    
+    def poll(self):
+        results = []
+        for clip_name, written, error in self.exporter.poll():
+            target = self.targets.get(clip_name)
+            if target is not None:
+                _, _, output_path, record = target
+                tmp_path = partial_path(output_path)
+                if error is None and written > 0:
+                    try:
+                        self.commit(clip_name, tmp_path, output_path)
+                        self.manifest.mark_done(self.manifest_key(clip_name), record, output_path)
+                    except OSError as e:
+                        error = str(e)
+                elif error is None:
+                    error = "No frames written"
+                if error is not None and os.path.exists(tmp_path):
+                    self.discard(tmp_path)
+            results.append((clip_name, written, error))
+        return results
+    
+    def commit(self, clip_name, tmp_path, output_path):
+        os.replace(tmp_path, output_path)
+    
+    def discard(self, tmp_path):
+        os.remove(tmp_path)
+    
+    def finished(self):
+        return self.exporter is None or self.exporter.finished()
+    
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.shutdown()
+
+class DatasetLabels:
+    # Integer label for each action class, shared by every dataset written
+    # under one output root so a class keeps its number across videos and
+    # runs. New classes are appended; existing ones are never renumbered
+    FILENAME = "labels.csv"
+    
+    def __init__(self, path):
+        self.path = path
+        self.labels = {}
+    
+    def load(self):
+        self.labels = {}
+        if os.path.exists(self.path):
+            df = pd.read_csv(self.path, dtype={"Action Class ID": str}, keep_default_na=False)
+            self.labels = dict(zip(df["Action Class ID"], df["Label"].astype(int)))
+    
+    def encode(self, classes):
+        # Labels for classes, adding any not seen before. Re-read first, as
+        # other sessions may have added classes since
+        self.load()
+        new = sorted(set(classes) - set(self.labels))
+        if new:
+            next_label = max(self.labels.values(), default=-1) + 1
+            for label, action_class in enumerate(new, next_label):
+                self.labels[action_class] = label
+            self.save()
+        return [self.labels[action_class] for action_class in classes]
+    
+    def save(self):
+        tmp_path = self.path + ".tmp"
+        pd.DataFrame({"Label": list(self.labels.values()),
+                      "Action Class ID": list(self.labels)}).to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+
+class DatasetSession(ExportSession):
+    # Export run that writes training data instead of video files: one .npy
+    # array or image folder per clip under save_dir/dataset at a fixed frame
+    # size and stride, plus dataset_index.csv mapping each one to its labels.
+    # Integer labels come from labels_path (labels.csv in save_dir unless
+    # several sessions share one). Shares the manifest logic, so re-runs only
+    # redo clips whose range or dataset settings changed
+    DIRNAME = "dataset"
+    INDEX_NAME = "dataset_index.csv"
+    
+    def __init__(self, video_path, save_dir, fps, frame_size, fmt="NumPy", stride=1, workers=None,
+                 index=None, pool=None, labels_path=None):
+        dataset_dir = os.path.join(save_dir, self.DIRNAME)
+        os.makedirs(dataset_dir, exist_ok=True)
+        self.fmt = fmt
+        self.stride = max(1, int(stride))
+        self.labels = DatasetLabels(labels_path or os.path.join(save_dir, DatasetLabels.FILENAME))
+        super().__init__(video_path, dataset_dir, fps, frame_size, mode=f"Dataset ({fmt})",
+                         workers=workers, index=index, pool=pool)
+        # Exact size: training inputs need not be even-sized like video frames
+        self.frame_size = tuple(int(v) for v in frame_size)
+    
+    @property
+    def total_frames(self):
+        return sum(len(range(start_frame, end_frame + 1, self.stride))
+                   for start_frame, end_frame, _, _ in self.targets.values())
+    
+    def record(self, start_frame, end_frame):
+        record = super().record(start_frame, end_frame)
+        record["settings"]["stride"] = self.stride
+        return record
+    
+    def output_path(self, clip_name, fmt=None):
+        root = os.path.splitext(clip_name)[0]
+        return os.path.join(self.save_dir, root + (".npy" if (fmt or self.fmt) == "NumPy" else ""))
+    
+    def manifest_key(self, clip_name, fmt=None):
+        # JPEG and PNG share a folder name, so the format is part of the key
+        return f"{clip_name} [{fmt or self.fmt}]"
+    
+    def make_exporter(self, job_count):
+        return DatasetExporter(self.video_path, self.fps, self.frame_size, stride=self.stride, fmt=self.fmt,
+                               workers=min(self.workers or job_count, job_count), pool=self.pool)
+    
+    def commit(self, clip_name, tmp_path, output_path):
+        # Also drop what an earlier run in another format left for this clip
+        for fmt in DATASET_FORMATS:
+            if fmt == self.fmt:
+                continue
+            self.manifest.entries.pop(self.manifest_key(clip_name, fmt), None)
+            old_path = self.output_path(clip_name, fmt)
+            if old_path != output_path and os.path.isfile(old_path):
+                os.remove(old_path)
+            elif old_path != output_path and os.path.isdir(old_path):
+                shutil.rmtree(old_path)
+        if os.path.isdir(output_path):
+            shutil.rmtree(output_path)
+        os.replace(tmp_path, output_path)
+    
+    def discard(self, tmp_path):
+        if os.path.isdir(tmp_path):
+            shutil.rmtree(tmp_path)
+        else:
+            os.remove(tmp_path)
+    
+    def write_index(self, df):
+        # One row per clip whose data exists: its path relative to the dataset
+        # directory, frame count, the shared integer label for the action
+        # class, and the clips_metadata labels. Returns the number of rows
+        rows = []
+        labels = self.labels.encode(df["Action Class ID"].astype(str).tolist())
+        for record, label in zip(df.to_dict("records"), labels):
+            path = self.output_path(str(record["Clip Name"]))
+            if not os.path.exists(path):
+                continue
+            if self.fmt == "NumPy":
+                frames = np.load(path, mmap_mode="r").shape[0]
+            else:
+                frames = len(os.listdir(path))
+            rows.append({
+                "Path": os.path.basename(path),
+                "Frames": frames,
+                "Label": label,
+                "Action Class ID": record["Action Class ID"],
+                "Team": record["Team"],
+                "Equipment": record["Equipment"],
+                "Description": record["Description"],
+                "Clip Name": record["Clip Name"],
+                "Start Frame": record["Start Frame"],
+                "End Frame": record["End Frame"],
+                "Stride": self.stride,
+                "Width": self.frame_size[0],
+                "Height": self.frame_size[1],
+                "Source Video": self.video_path,
+            })
+        write_clip_table(pd.DataFrame(rows), os.path.join(self.save_dir, self.INDEX_NAME))
+        return len(rows)
+
+class CategoryTable:
+    # Interns label strings (action class, team, equipment): each distinct
+    # label is stored once and clip tables refer to it by a small integer code
+    def __init__(self):
+        self.labels = []
+        self.codes = {}
+    
+    def code(self, label):
+        code = self.codes.get(label)
+        if code is None:
+            code = self.codes[label] = len(self.labels)
+            self.labels.append(label)
+        return code
+    
+    def intern(self, label):
+        return self.labels[self.code(label)]
+    
+    def encode(self, values):
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object).fillna(""))
+        mapping = np.array([self.code(str(label)) for label in uniques] or [0], dtype=np.int32)
+        return mapping[codes]
+    
+    def decode(self, codes):
+        return np.array(self.labels, dtype=object)[codes]
+
+class ClipRecord:
+    # One marked clip. Slotted to keep per-clip overhead small; times are kept
+    # in seconds and only formatted for display and export, and frames are
+    # None until known (clips loaded from an older CSV before a video is open)
+    __slots__ = ("clip_name", "start_frame", "end_frame", "start_seconds", "end_seconds",
+                 "action_class", "description", "team", "equipment")
+    
+    def __init__(self, clip_name, start_frame, end_frame, start_seconds, end_seconds,
+                 action_class="", description="", team="", equipment=""):
+        self.clip_name = clip_name
+        self.start_frame = start_frame
+        self.end_frame = end_frame
+        self.start_seconds = start_seconds
+        self.end_seconds = end_seconds
+        self.action_class = action_class
+        self.description = description
+        self.team = team
+        self.equipment = equipment
+
+class ClipTable:
+    # Column arrays for bulk work over many clips: loading and writing
+    # metadata, sorting, overlap checks and duration totals. Numeric columns
+    # share one structured array (frames are -1 where unknown); label columns
+    # hold codes into a CategoryTable
+    DTYPE = np.dtype([("id", np.int64), ("start_frame", np.int64), ("end_frame", np.int64),
+                      ("start_seconds", np.float64), ("end_seconds", np.float64),
+                      ("action_class", np.int32), ("team", np.int32), ("equipment", np.int32)])
+    
+    def __init__(self, data, clip_names, descriptions, labels):
+        self.data = data
+        self.clip_names = clip_names
+        self.descriptions = descriptions
+        self.labels = labels
+    
+    def __len__(self):
+        return len(self.data)
+    
+    @classmethod
+    def from_records(cls, records, labels):
+        # records: {clip_id: ClipRecord}
+        clips = list(records.values())
+        data = np.empty(len(clips), dtype=cls.DTYPE)
+        data["id"] = list(records)
+        data["start_frame"] = [-1 if clip.start_frame is None else clip.start_frame for clip in clips]
+        data["end_frame"] = [-1 if clip.end_frame is None else clip.end_frame for clip in clips]
+        data["start_seconds"] = [clip.start_seconds for clip in clips]
+        data["end_seconds"] = [clip.end_seconds for clip in clips]
+        for field in ("action_class", "team", "equipment"):
+            data[field] = labels.encode([getattr(clip, field) for clip in clips])
+        return cls(data, np.array([clip.clip_name for clip in clips], dtype=object),
+                   np.array([clip.description for clip in clips], dtype=object), labels)
+    
+    @classmethod
+    def from_frame(cls, df, labels, first_id=1):
+        # df: as returned by read_clip_table
+        data = np.empty(len(df), dtype=cls.DTYPE)
+        data["id"] = np.arange(first_id, first_id + len(df))
+        data["start_frame"] = df["Start Frame"].to_numpy()
+        data["end_frame"] = df["End Frame"].to_numpy()
+        data["start_seconds"] = df["Start Seconds"].to_numpy()
+        data["end_seconds"] = df["End Seconds"].to_numpy()
+        data["action_class"] = labels.encode(df["Action Class ID"])
+        data["team"] = labels.encode(df["Team"])
+        data["equipment"] = labels.encode(df["Equipment"])
+        return cls(data, df["Clip Name"].to_numpy(dtype=object),
+                   df["Description"].fillna("").astype(str).to_numpy(dtype=object), labels)
+    
+    def records(self):
+        # (clip_id, ClipRecord) pairs, labels resolved to their interned strings
+        labels = self.labels.labels
+        data = self.data
+        columns = zip(data["id"].tolist(), self.clip_names.tolist(), data["start_frame"].tolist(),
+                      data["end_frame"].tolist(), data["start_seconds"].tolist(), data["end_seconds"].tolist(),
+                      data["action_class"].tolist(), self.descriptions.tolist(), data["team"].tolist(),
+                      data["equipment"].tolist())
+        for clip_id, name, start, end, start_s, end_s, action_class, description, team, equipment in columns:
+            yield clip_id, ClipRecord(name, None if start < 0 else start, None if end < 0 else end,
+                                      start_s, end_s, labels[action_class], description, labels[team],
+                                      labels[equipment])
+    
+    def argsort(self, field):
+        # Stable row order by one column. Label columns sort by their text, not
+        # their codes, and clip names naturally (clip_2 before clip_10)
+        if field == "clip_name":
+            lengths = np.fromiter(map(len, self.clip_names), dtype=np.int64, count=len(self))
+            return np.lexsort((self.clip_names.astype(str), lengths))
+        if field == "description":
+            return np.argsort(self.descriptions.astype(str), kind="stable")
+        if field in ("action_class", "team", "equipment"):
+            ranks = np.argsort(np.argsort(np.array(self.labels.labels, dtype=str), kind="stable"))
+            return np.argsort(ranks[self.data[field]], kind="stable")
+        return np.argsort(self.data[field], kind="stable")
+    
+    def total_duration(self):
+        return float(np.sum(self.data["end_seconds"] - self.data["start_seconds"]))
+    
+    def to_frame(self, fps, source_path=None, source_hash=None):
+        # clips_metadata layout. The first eight columns are the original CSV;
+        # frame indices, fps and source identity were appended so older readers
+        # still find their columns
+        data = self.data
+        return pd.DataFrame({
+            "S.No": np.arange(1, len(data) + 1),
+            "Clip Name": self.clip_names,
+            "Action Class ID": self.labels.decode(data["action_class"]),
+            "Start Time Stamp": [format_timestamp(t) for t in data["start_seconds"].tolist()],
+            "End Time Stamp": [format_timestamp(t) for t in data["end_seconds"].tolist()],
+            "Description": self.descriptions,
+            "Team": self.labels.decode(data["team"]),
+            "Equipment": self.labels.decode(data["equipment"]),
+            "Start Frame": pd.Series(data["start_frame"], dtype="Int64").mask(data["start_frame"] < 0),
+            "End Frame": pd.Series(data["end_frame"], dtype="Int64").mask(data["end_frame"] < 0),
+            "FPS": float(fps),
+            "Source Video": source_path or "",
+            "Source Hash": source_hash or "",
+        })
+
+class ActionLogger:
+    # Appends action log lines from a background thread so logging never
+    # blocks the UI. Lines are queued, written in one batch per flush interval
+    # (grouped by file, since the save directory can change), and a log past
+    # max_bytes is rotated to .1, .2, ... keeping `backups` old files
+    def __init__(self, flush_interval=0.5, max_bytes=5 << 20, backups=3):
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = queue.Queue()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def write(self, path, line):
+        self.queue.put((path, line))
+    
+    def run(self):
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            self.stopping.wait(self.flush_interval)
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            running = None not in batch
+            
+            by_path = {}
+            for item in batch:
+                if item is not None:
+                    by_path.setdefault(item[0], []).append(item[1])
+            for path, lines in by_path.items():
+                self.append(path, "".join(lines))
+    
+    def append(self, path, text):
+        # Sized and written as UTF-8 bytes, so non-ASCII lines count in full
+        data = text.encode("utf-8")
+        try:
+            if os.path.exists(path) and os.path.getsize(path) + len(data) > self.max_bytes:
+                self.rotate(path)
+            with open(path, "ab") as f:
+                f.write(data)
+        except OSError as e:
+            print(f"Error writing to log: {e}")
+    
+    def rotate(self, path):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        os.replace(path, f"{path}.1")
+    
+    def close(self):
+        # Flush whatever is queued and stop the writer
+        self.queue.put(None)
+        self.stopping.set()
+        self.thread.join(timeout=5)
+
+def read_tail(path, max_lines, block_size=1 << 16):
+    # Last max_lines lines of a text file, reading backwards from the end so a
+    # large log costs only what is shown
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= max_lines:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.decode("utf-8", errors="replace").splitlines(keepends=True)
+    return "".join(lines[-max_lines:])
+
+class AnnotationStore:
+    # Clip annotations in a SQLite database in the save directory, indexed on
+    # (video, start_frame, end_frame) and on action class so overlap and label
+    # queries don't scan every clip. Each insert or delete is one transaction.
+    # Lives in memory until a save directory is chosen. It is the record of
+    # what was marked: the app loads a video's rows back from it and merges
+    # them with its clip dict, and rows are only ever removed by a delete
+    FILENAME = "annotations.db"
+    FIELDS = list(ClipRecord.__slots__)
+    
+    def __init__(self, save_dir=None):
+        self.save_dir = save_dir
+        self.path = os.path.join(save_dir, self.FILENAME) if save_dir else ":memory:"
+        self.conn = sqlite3.connect(self.path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS clips (
+                id INTEGER PRIMARY KEY,
+                video TEXT NOT NULL,
+                clip_name TEXT NOT NULL,
+                start_frame INTEGER,
+                end_frame INTEGER,
+                start_seconds REAL,
+                end_seconds REAL,
+                action_class TEXT,
+                description TEXT,
+                team TEXT,
+                equipment TEXT,
+                UNIQUE (video, clip_name)
+            );
+            CREATE INDEX IF NOT EXISTS clips_range ON clips (video, start_frame, end_frame);
+            CREATE INDEX IF NOT EXISTS clips_class ON clips (action_class);
+        """)
+        columns = ", ".join(["video"] + self.FIELDS)
+        self.insert_sql = (f"INSERT OR REPLACE INTO clips ({columns}) "
+                           f"VALUES ({', '.join('?' * (len(self.FIELDS) + 1))})")
+    
+    def row(self, video, clip):
+        return (video,) + tuple(getattr(clip, field) for field in self.FIELDS)
+    
+    def add(self, video, clip):
+        with self.conn:
+            return self.conn.execute(self.insert_sql, self.row(video, clip)).lastrowid
+    
+    def add_many(self, video, clips):
+        with self.conn:
+            self.conn.executemany(self.insert_sql, (self.row(video, clip) for clip in clips))
+    
+    def copy_to(self, other):
+        # Rows other doesn't have yet; used when the in-memory store gives way
+        # to a save directory's database
+        rows = self.conn.execute(f"SELECT video, {', '.join(self.FIELDS)} FROM clips")
+        with other.conn:
+            other.conn.executemany(other.insert_sql.replace("OR REPLACE", "OR IGNORE", 1),
+                                   (tuple(row) for row in rows))
+    
+    def move_video(self, old_video, video):
+        # Give old_video's rows to video, keeping video's own row on a name clash
+        with self.conn:
+            self.conn.execute("UPDATE OR IGNORE clips SET video = ? WHERE video = ?", (video, old_video))
+            self.conn.execute("DELETE FROM clips WHERE video = ?", (old_video,))
+    
+    def delete(self, video, clip_name):
+        with self.conn:
+            self.conn.execute("DELETE FROM clips WHERE video = ? AND clip_name = ?", (video, clip_name))
+    
+    def query(self, where, params):
+        sql = f"SELECT id, {', '.join(self.FIELDS)} FROM clips WHERE {where} ORDER BY start_frame"
+        return [dict(row) for row in self.conn.execute(sql, params)]
+    
+    def clips(self, video):
+        return self.query("video = ?", (video,))
+    
+    def records(self, video, labels):
+        # The video's clips as ClipRecords, label columns interned in labels
+        records = []
+        for row in self.clips(video):
+            values = {field: row[field] for field in self.FIELDS}
+            for field in ("action_class", "team", "equipment"):
+                values[field] = labels.intern(values[field] or "")
+            records.append(ClipRecord(**values))
+        return records
+    
+    def overlapping(self, video, start_frame, end_frame):
+        # Clips of video sharing at least one frame with [start_frame, end_frame]
+        return self.query("video = ? AND start_frame <= ? AND end_frame >= ?",
+                          (video, end_frame, start_frame))
+    
+    def by_class(self, action_class, video=None):
+        if video is None:
+            return self.query("action_class = ?", (action_class,))
+        return self.query("action_class = ? AND video = ?", (action_class, video))
+    
+    def close(self):
+        self.conn.close()
+
+class VirtualClipList:
+    # Clip list that only ever holds the rows currently on screen. Records stay
+    # in the caller's dict keyed by clip id; `order` is the filtered and sorted
+    # id list, and scrolling just rewrites the values of the visible rows.
+    # Removed ids are left as None in `order` (found through `positions`) and
+    # compacted away once they make up a quarter of it.
+    # sort_order(clip_ids, column) returns the ids in ascending column order
+    def __init__(self, parent, columns, widths, row_values, sort_order):
+        self.row_values = row_values
+        self.sort_order = sort_order
+        self.records = {}
+        self.order = []
+        self.positions = {}
+        self.removed = 0
+        self.visible = []
+        self.first = 0
+        self.rows = 1
+        self.sort_column = None
+        self.sort_reverse = False
+        self.match = None
+        self.selected = None
+        
+        self.scrollbar = tk.Scrollbar(parent, command=self.on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree = ttk.Treeview(parent, columns=columns, show="headings", selectmode="browse")
+        for col, width in zip(columns, widths):
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by(c))
+            self.tree.column(col, width=width)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        self.row_height = int(ttk.Style().lookup("Treeview", "rowheight") or 20)
+        self.tree.bind("<Configure>", self.on_resize)
+        self.tree.bind("<<TreeviewSelect>>", self.on_select)
+        self.tree.bind("<MouseWheel>", self.on_wheel)
+        self.tree.bind("<Button-4>", self.on_wheel)
+        self.tree.bind("<Button-5>", self.on_wheel)
+    
+    def set_records(self, records):
+        self.records = records
+        self.selected = None
+        self.refresh()
+    
+    def set_filter(self, match):
+        # match(record) -> bool, or None to show everything
+        self.match = match
+        self.refresh()
+    
+    def sort_by(self, column):
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column, self.sort_reverse = column, False
+        self.refresh()
+    
+    def refresh(self):
+        records = self.records
+        if self.match is None:
+            self.order = list(records)
+        else:
+            self.order = [clip_id for clip_id, record in records.items() if self.match(record)]
+        if self.sort_column is not None:
+            self.order = self.sort_order(self.order, self.sort_column)
+            if self.sort_reverse:
+                self.order.reverse()
+        self.compact()
+        self.scroll_to(self.first)
+    
+    def compact(self):
+        self.order = [clip_id for clip_id in self.order if clip_id is not None]
+        self.positions = {clip_id: i for i, clip_id in enumerate(self.order)}
+        self.removed = 0
+    
+    def add(self, clip_id):
+        # New clips go at the end of the view; re-sorting is left to the next
+        # heading click so the row just marked stays where the user expects
+        if self.match is None or self.match(self.records[clip_id]):
+            self.positions[clip_id] = len(self.order)
+            self.order.append(clip_id)
+            self.scroll_to(len(self.order))
+    
+    def remove(self, clip_id):
+        if clip_id == self.selected:
+            self.selected = None
+        pos = self.positions.pop(clip_id, None)
+        if pos is not None:
+            self.order[pos] = None
+            self.removed += 1
+            if self.removed * 4 > len(self.order):
+                self.compact()
+        self.render()
+    
+    def scroll_to(self, first):
+        self.first = max(0, min(first, len(self.order) - self.rows))
+        self.render()
+    
+    def render(self):
+        order = self.order
+        visible = []
+        i = self.first
+        while len(visible) < self.rows and i < len(order):
+            if order[i] is not None:
+                visible.append(order[i])
+            i += 1
+        self.visible = visible
+        end = i
+        count = len(visible)
+        items = self.tree.get_children()
+        for i in range(len(items), count):
+            self.tree.insert("", tk.END, iid=f"row{i}")
+        if len(items) > count:
+            self.tree.delete(*items[count:])
+        
+        for i, clip_id in enumerate(visible):
+            self.tree.item(f"row{i}", values=self.row_values(self.records[clip_id]))
+        if self.selected in visible:
+            self.tree.selection_set(f"row{visible.index(self.selected)}")
+        else:
+            self.tree.selection_set(())
+        
+        total = len(order)
+        if total:
+            self.scrollbar.set(self.first / total, end / total)
+        else:
+            self.scrollbar.set(0, 1)
+    
+    def on_select(self, event):
+        selection = self.tree.selection()
+        if selection:
+            self.selected = self.visible[self.tree.index(selection[0])]
+    
+    def on_resize(self, event):
+        # One row's worth of height goes to the headings
+        rows = max(1, event.height // self.row_height - 1)
+        if rows != self.rows:
+            self.rows = rows
+            self.scroll_to(self.first)
+    
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.order)))
+        else:
+            step = self.rows if unit == "pages" else 1
+            self.scroll_to(self.first + int(amount) * step)
+    
+    def on_wheel(self, event):
+        up = event.num == 4 or getattr(event, "delta", 0) > 0
+        self.scroll_to(self.first + (-3 if up else 3))
+        return "break"
 
 class VideoClipMarker:
+    HISTORY_LINES = 500
+    SNAP_SECONDS = 1.0
+    
     def __init__(self, root):
         self.root = root
         self.root.title("ClipForge ~ By Kunal Sinha")
@@ -15,6 +2437,10 @@ class VideoClipMarker:
         
         # Video variables
         self.cap = None
+        self.reader = None
+        self.index = None
+        self.loaded_path = None
+        self.proxy_path = None
         self.current_frame = 0
         self.total_frames = 0
         self.fps = 0
@@ -22,19 +2448,39 @@ class VideoClipMarker:
         self.video_height = 0
         self.playback_speed = 1
         self.is_playing = False
-        self.updating_slider = False
+        self.engine = None
+        self.play_job = None
+        self.frame_cache = FrameCache()
+        self.prefetcher = None
+        self.timer = StageTimer()
+        self.renderer = FrameRenderer(*DISPLAY_SIZE, timer=self.timer)
+        self.play_due = None
+        self.speed_shown_at = 0.0
         
         # Clip marking variables
         self.start_frame = None
         self.start_time = None
         self.end_frame = None
         self.end_time = None
-        self.clips = []
+        self.clips = {}
+        self.labels = CategoryTable()
+        self.next_clip_id = 1
         self.clip_counter = 1
+        self.scene_cuts = np.zeros(0, dtype=np.int64)
+        self.thumbnails = None
+        self.filmstrip_shown = -1
+        self.export_session = None
+        self.export_cancelled = False
+        self.store = AnnotationStore()
+        self.logger = ActionLogger()
+        self.pending_log = []
+        self.log_flush_job = None
         
         # File paths
         self.video_path = tk.StringVar()
         self.save_path = tk.StringVar()
+        self.use_proxy = tk.BooleanVar(value=False)
+        self.snap_to_cuts = tk.BooleanVar(value=True)
         
         self.setup_ui()
         
@@ -52,6 +2498,8 @@ class VideoClipMarker:
         tk.Entry(paths_frame, textvariable=self.video_path, width=50).grid(row=0, column=1, padx=5)
         tk.Button(paths_frame, text="Browse", command=self.browse_video).grid(row=0, column=2, padx=2)
         tk.Button(paths_frame, text="Load", command=self.load_video, bg="#4CAF50", fg="white").grid(row=0, column=3, padx=2)
+        tk.Checkbutton(paths_frame, text="Proxy", variable=self.use_proxy,
+                       command=self.toggle_proxy).grid(row=0, column=4, padx=5)
         
         # Save Path
         tk.Label(paths_frame, text="Save Path:", font=("Arial", 10, "bold")).grid(row=1, column=0, sticky=tk.W, pady=5)
@@ -68,6 +2516,53 @@ class VideoClipMarker:
         tk.Button(actions_frame, text="🗑️ Delete Selected Clip", command=self.delete_selected_clip,
                  font=("Arial", 10), bg="#f44336", fg="white", padx=20, pady=5).pack()
         
+        export_options = tk.Frame(actions_frame)
+        export_options.pack(pady=5)
+        tk.Label(export_options, text="Export workers:", font=("Arial", 9)).pack(side=tk.LEFT)
+        self.export_workers = tk.IntVar(value=os.cpu_count() or 1)
+        tk.Spinbox(export_options, from_=1, to=64, width=4,
+                   textvariable=self.export_workers).pack(side=tk.LEFT, padx=5)
+        
+        self.export_mode = tk.StringVar(value=EXPORT_MODES[0])
+        ttk.Combobox(export_options, textvariable=self.export_mode, state="readonly", width=18,
+                     values=EXPORT_MODES).pack(side=tk.LEFT, padx=5)
+        
+        tk.Label(export_options, text="Scale:", font=("Arial", 9)).pack(side=tk.LEFT)
+        self.export_scale = tk.StringVar(value="100%")
+        ttk.Combobox(export_options, textvariable=self.export_scale, state="readonly", width=5,
+                     values=["100%", "75%", "50%", "25%"]).pack(side=tk.LEFT, padx=5)
+        
+        tk.Label(export_options, text="Metadata:", font=("Arial", 9)).pack(side=tk.LEFT)
+        self.metadata_format = tk.StringVar(value="CSV")
+        ttk.Combobox(export_options, textvariable=self.metadata_format, state="readonly", width=8,
+                     values=list(METADATA_FORMATS)).pack(side=tk.LEFT, padx=5)
+        
+        dataset_options = tk.Frame(actions_frame)
+        dataset_options.pack(pady=(0, 5))
+        tk.Label(dataset_options, text="Dataset:", font=("Arial", 9)).pack(side=tk.LEFT)
+        self.dataset_format = tk.StringVar(value="NumPy")
+        ttk.Combobox(dataset_options, textvariable=self.dataset_format, state="readonly", width=7,
+                     values=list(DATASET_FORMATS)).pack(side=tk.LEFT, padx=5)
+        tk.Label(dataset_options, text="Size:", font=("Arial", 9)).pack(side=tk.LEFT)
+        self.dataset_size = tk.StringVar(value="224x224")
+        tk.Entry(dataset_options, textvariable=self.dataset_size, width=9).pack(side=tk.LEFT, padx=5)
+        tk.Label(dataset_options, text="Stride:", font=("Arial", 9)).pack(side=tk.LEFT)
+        self.dataset_stride = tk.IntVar(value=1)
+        tk.Spinbox(dataset_options, from_=1, to=120, width=4,
+                   textvariable=self.dataset_stride).pack(side=tk.LEFT, padx=5)
+        tk.Button(dataset_options, text="Export Dataset", command=self.export_dataset,
+                  font=("Arial", 9)).pack(side=tk.LEFT, padx=5)
+        
+        progress_frame = tk.Frame(actions_frame)
+        progress_frame.pack(fill=tk.X)
+        self.export_progress = ttk.Progressbar(progress_frame, length=220, mode="determinate")
+        self.export_progress.pack(side=tk.LEFT)
+        self.cancel_btn = tk.Button(progress_frame, text="Cancel", command=self.cancel_export,
+                                    font=("Arial", 8), state=tk.DISABLED)
+        self.cancel_btn.pack(side=tk.LEFT, padx=5)
+        self.export_status = tk.Label(actions_frame, text="", font=("Arial", 8), fg="gray")
+        self.export_status.pack()
+        
         # Main Section - Split into Left and Right
         main_frame = tk.Frame(self.root)
         main_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -80,9 +2575,21 @@ class VideoClipMarker:
         player_frame = tk.LabelFrame(left_panel, text="Video Player", font=("Arial", 10, "bold"))
         player_frame.pack(fill=tk.BOTH, pady=5)
         
-        self.canvas = tk.Canvas(player_frame, width=640, height=360, bg="black")
+        self.canvas = tk.Canvas(player_frame, width=DISPLAY_SIZE[0], height=DISPLAY_SIZE[1], bg="black",
+                                highlightthickness=0)
         self.canvas.pack(pady=5)
         
+        # One persistent canvas item whose image is updated in place. The PIL
+        # image shares memory with display_buffer, so showing a frame is a copy
+        # into that buffer plus a paste
+        self.display_buffer = np.zeros((DISPLAY_SIZE[1], DISPLAY_SIZE[0], 4), dtype=np.uint8)
+        self.display_buffer[..., 3] = 255
+        self.display_image = Image.frombuffer("RGBA", DISPLAY_SIZE, self.display_buffer, "raw", "RGBA", 0, 1)
+        self.photo = ImageTk.PhotoImage("RGBA", DISPLAY_SIZE)
+        self.canvas_image = self.canvas.create_image(0, 0, anchor=tk.NW, image=self.photo)
+        self.hud_text = self.canvas.create_text(8, 8, anchor=tk.NW, fill="#00ff00", font=("Courier", 9),
+                                                state=tk.HIDDEN)
+        
         # Controls Section
         controls_frame = tk.LabelFrame(left_panel, text="Controls", font=("Arial", 10, "bold"))
         controls_frame.pack(fill=tk.X, pady=5)
@@ -100,7 +2607,7 @@ class VideoClipMarker:
         speed_frame.pack(side=tk.LEFT, padx=20)
         
         tk.Label(speed_frame, text="Speed:", font=("Arial", 9)).pack(side=tk.LEFT, padx=5)
-        for speed in [-16, -8, -4, -3, -2, -1, 1, 2, 3, 4, 8, 16]:
+        for speed in PLAYBACK_SPEEDS:
             tk.Button(speed_frame, text=f"{speed}x", command=lambda s=speed: self.set_speed(s),
                      width=4, font=("Arial", 8)).pack(side=tk.LEFT, padx=2)
         
@@ -115,9 +2622,47 @@ class VideoClipMarker:
                                 command=self.seek_video, showvalue=False)
         self.timeline.pack(fill=tk.X)
         
+        # Marked clips under the timeline; ones overlapping the cursor or the
+        # range being marked are highlighted
+        self.clip_strip = tk.Canvas(timeline_frame, height=10, bg="#e0e0e0", highlightthickness=0)
+        self.clip_strip.pack(fill=tk.X, padx=8)
+        self.clip_strip.bind("<Configure>", lambda event: self.draw_clip_strip())
+        
+        # Thumbnail overview of the whole video; hover previews and click seeks
+        # without decoding anything
+        self.filmstrip = tk.Canvas(timeline_frame, height=54, bg="#404040", highlightthickness=0)
+        self.filmstrip.pack(fill=tk.X, padx=8, pady=(2, 0))
+        self.filmstrip.bind("<Configure>", lambda event: self.draw_filmstrip())
+        self.filmstrip.bind("<Motion>", self.preview_filmstrip)
+        self.filmstrip.bind("<Leave>", lambda event: self.canvas.itemconfig(self.preview_item, state=tk.HIDDEN))
+        self.filmstrip.bind("<Button-1>", self.seek_filmstrip)
+        self.filmstrip_photo = None
+        self.preview_photo = None
+        self.preview_item = self.canvas.create_image(DISPLAY_SIZE[0] - 8, 8, anchor=tk.NE, state=tk.HIDDEN)
+        
         self.time_label = tk.Label(timeline_frame, text="00:00:00.000 / 00:00:00.000", font=("Arial", 10))
         self.time_label.pack()
         
+        stats_frame = tk.Frame(timeline_frame)
+        stats_frame.pack()
+        
+        self.seek_label = tk.Label(stats_frame, text="Seeks: 0", font=("Arial", 8), fg="gray")
+        self.seek_label.pack(side=tk.LEFT, padx=5)
+        
+        self.cache_label = tk.Label(stats_frame, text="Cache: empty", font=("Arial", 8), fg="gray")
+        self.cache_label.pack(side=tk.LEFT, padx=5)
+        
+        tk.Label(stats_frame, text="Cache MB:", font=("Arial", 8)).pack(side=tk.LEFT, padx=(10, 2))
+        self.cache_budget = tk.IntVar(value=256)
+        tk.Spinbox(stats_frame, from_=32, to=8192, increment=32, width=6, textvariable=self.cache_budget,
+                   command=self.update_cache_budget).pack(side=tk.LEFT)
+        
+        self.show_hud = tk.BooleanVar(value=False)
+        tk.Checkbutton(stats_frame, text="Stats overlay", variable=self.show_hud, font=("Arial", 8),
+                       command=self.toggle_hud).pack(side=tk.LEFT, padx=(10, 2))
+        tk.Button(stats_frame, text="Dump stats", command=self.dump_stats,
+                  font=("Arial", 8)).pack(side=tk.LEFT, padx=2)
+        
         # Clip Marking Section
         marking_frame = tk.LabelFrame(left_panel, text="Clip Marking", font=("Arial", 10, "bold"))
         marking_frame.pack(fill=tk.X, pady=5)
@@ -132,6 +2677,18 @@ class VideoClipMarker:
         tk.Button(mark_btn_frame, text="✖ Clear Current", command=self.clear_current,
                  font=("Arial", 10), width=15).pack(side=tk.LEFT, padx=5)
         
+        cut_frame = tk.Frame(marking_frame)
+        cut_frame.pack()
+        
+        tk.Button(cut_frame, text="◀ Cut", command=lambda: self.jump_to_cut(-1),
+                  font=("Arial", 8), width=6).pack(side=tk.LEFT, padx=2)
+        tk.Button(cut_frame, text="Cut ▶", command=lambda: self.jump_to_cut(1),
+                  font=("Arial", 8), width=6).pack(side=tk.LEFT, padx=2)
+        tk.Checkbutton(cut_frame, text="Snap marks to scene cuts", variable=self.snap_to_cuts,
+                       font=("Arial", 8)).pack(side=tk.LEFT, padx=(10, 2))
+        self.cut_label = tk.Label(cut_frame, text="Scene cuts: -", font=("Arial", 8), fg="gray")
+        self.cut_label.pack(side=tk.LEFT, padx=5)
+        
         mark_info_frame = tk.Frame(marking_frame)
         mark_info_frame.pack(pady=5)
         
@@ -197,20 +2754,26 @@ class VideoClipMarker:
         clips_container = tk.Frame(clips_frame)
         clips_container.pack(fill=tk.BOTH, expand=True)
         
-        clips_scrollbar = tk.Scrollbar(clips_container)
-        clips_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        
         columns = ("Clip Name", "Start Time", "End Time", "Action Class", "Description")
-        self.clips_tree = ttk.Treeview(clips_container, columns=columns, show="headings",
-                                      yscrollcommand=clips_scrollbar.set)
-        
-        for col in columns:
-            self.clips_tree.heading(col, text=col)
-            width = 100 if col != "Description" else 120
-            self.clips_tree.column(col, width=width)
-        
-        self.clips_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        clips_scrollbar.config(command=self.clips_tree.yview)
+        self.clip_list = VirtualClipList(
+            clips_container, columns, [100, 100, 100, 100, 120],
+            lambda clip: (clip.clip_name, format_timestamp(clip.start_seconds),
+                          format_timestamp(clip.end_seconds), clip.action_class, clip.description),
+            self.clip_sort_order)
+        self.clip_list.set_records(self.clips)
+        
+        filter_frame = tk.Frame(clips_frame)
+        filter_frame.pack(fill=tk.X)
+        tk.Label(filter_frame, text="Filter:", font=("Arial", 9)).pack(side=tk.LEFT)
+        self.clip_filter_field = tk.StringVar(value="Action Class")
+        ttk.Combobox(filter_frame, textvariable=self.clip_filter_field, state="readonly", width=12,
+                     values=["Action Class", "Team", "At cursor"]).pack(side=tk.LEFT, padx=5)
+        self.clip_filter_text = tk.StringVar()
+        tk.Entry(filter_frame, textvariable=self.clip_filter_text, width=15).pack(side=tk.LEFT)
+        tk.Button(filter_frame, text="Apply", command=self.apply_clip_filter,
+                  font=("Arial", 8)).pack(side=tk.LEFT, padx=5)
+        tk.Button(filter_frame, text="Clear", command=self.clear_clip_filter,
+                  font=("Arial", 8)).pack(side=tk.LEFT)
         
         self.log_action("Application started")
     
@@ -218,79 +2781,63 @@ class VideoClipMarker:
         timestamp = datetime.now().strftime("[%Y-%m-%d %H:%M:%S]")
         message = f"{timestamp} {action}\n"
         
-        # Display in history text widget
+        # Display in history text widget, batched with other lines logged
+        # in the same burst
+        self.pending_log.append(message)
+        if self.log_flush_job is None:
+            self.log_flush_job = self.root.after(100, self.flush_history)
+        
+        # Save to log file (written by the logger thread)
+        if self.save_path.get():
+            self.logger.write(os.path.join(self.save_path.get(), "actions_log.txt"), message)
+    
+    def flush_history(self):
+        self.log_flush_job = None
         self.history_text.config(state=tk.NORMAL)
-        self.history_text.insert(tk.END, message)
+        self.history_text.insert(tk.END, "".join(self.pending_log))
+        self.pending_log = []
+        # Keep only the last HISTORY_LINES lines (the widget ends with an empty line)
+        lines = int(self.history_text.index("end-1c").split(".")[0]) - 1
+        if lines > self.HISTORY_LINES:
+            self.history_text.delete("1.0", f"{lines - self.HISTORY_LINES + 1}.0")
         self.history_text.config(state=tk.DISABLED)
         self.history_text.see(tk.END)
-        
-        # Save to log file
-        if self.save_path.get():
-            log_file = os.path.join(self.save_path.get(), "actions_log.txt")
-            try:
-                with open(log_file, "a") as f:
-                    f.write(message)
-            except Exception as e:
-                print(f"Error writing to log: {e}")
     
     def load_history(self):
         if not self.save_path.get():
             messagebox.showerror("Error", "Please select a save directory first")
             return
         
-        csv_path = os.path.join(self.save_path.get(), "clips_metadata.csv")
+        csv_path = find_metadata(self.save_path.get())
         log_path = os.path.join(self.save_path.get(), "actions_log.txt")
         
-        # Load CSV if exists
-        if os.path.exists(csv_path):
+        # Load CSV (or Parquet/Feather, whichever is newest) if exists
+        if csv_path is not None:
             try:
-                df = pd.read_csv(csv_path)
+                df = read_clip_table(csv_path, self.fps if self.cap is not None else None, self.index)
                 
-                # Clear existing clips
-                self.clips = []
-                for item in self.clips_tree.get_children():
-                    self.clips_tree.delete(item)
+                # Build the clip table column-wise, then the per-clip records
+                table = ClipTable.from_frame(df, self.labels, first_id=self.next_clip_id)
+                self.clips = dict(table.records())
+                self.next_clip_id += len(self.clips)
+                self.clip_list.set_records(self.clips)
                 
-                # Load clips from CSV
-                for _, row in df.iterrows():
-                    clip_data = {
-                        "clip_name": row["Clip Name"],
-                        "start_frame": None,  # Frame info not in CSV
-                        "end_frame": None,
-                        "start_time": row["Start Time Stamp"],
-                        "end_time": row["End Time Stamp"],
-                        "action_class": row["Action Class ID"],
-                        "description": row["Description"],
-                        "team": row["Team"],
-                        "equipment": row["Equipment"]
-                    }
-                    self.clips.append(clip_data)
-                    
-                    # Add to treeview
-                    self.clips_tree.insert("", tk.END, values=(
-                        clip_data["clip_name"], 
-                        clip_data["start_time"], 
-                        clip_data["end_time"], 
-                        clip_data["action_class"], 
-                        clip_data["description"]
-                    ))
+                # Continue numbering after the highest "clip_X.mp4"
+                clip_numbers = pd.to_numeric(df["Clip Name"].str.extract(r"^clip_(\d+)\.mp4$")[0],
+                                             errors="coerce")
+                if clip_numbers.notna().any():
+                    self.clip_counter = int(clip_numbers.max()) + 1
                 
-                # Update clip counter
-                if len(self.clips) > 0:
-                    # Extract the highest clip number
-                    clip_numbers = []
-                    for clip in self.clips:
-                        try:
-                            # Extract number from "clip_X.mp4"
-                            num = int(clip["clip_name"].replace("clip_", "").replace(".mp4", ""))
-                            clip_numbers.append(num)
-                        except:
-                            pass
-                    
-                    if clip_numbers:
-                        self.clip_counter = max(clip_numbers) + 1
+                self.sync_store()
+                self.draw_clip_strip()
                 
-                self.log_action(f"Loaded {len(self.clips)} clips from history")
+                if "Source Hash" in df and self.loaded_path:
+                    hashes = set(df["Source Hash"].astype(str)) - {""}
+                    if hashes and source_fingerprint(self.loaded_path) not in hashes:
+                        self.log_action("Warning: history was recorded on a different source video")
+                
+                self.log_action(f"Loaded {len(self.clips)} clips from history "
+                                f"({format_timestamp(table.total_duration())} total)")
                 messagebox.showinfo("Success", f"Loaded {len(self.clips)} clips from history")
                 
             except Exception as e:
@@ -303,13 +2850,12 @@ class VideoClipMarker:
         # Load action log if exists
         if os.path.exists(log_path):
             try:
-                with open(log_path, "r") as f:
-                    log_content = f.read()
-                    self.history_text.config(state=tk.NORMAL)
-                    self.history_text.delete(1.0, tk.END)
-                    self.history_text.insert(tk.END, log_content)
-                    self.history_text.config(state=tk.DISABLED)
-                    self.history_text.see(tk.END)
+                log_content = read_tail(log_path, self.HISTORY_LINES)
+                self.history_text.config(state=tk.NORMAL)
+                self.history_text.delete(1.0, tk.END)
+                self.history_text.insert(tk.END, log_content)
+                self.history_text.config(state=tk.DISABLED)
+                self.history_text.see(tk.END)
             except Exception as e:
                 print(f"Error loading log: {e}")
     
@@ -325,9 +2871,9 @@ class VideoClipMarker:
         directory = filedialog.askdirectory(title="Select Save Directory")
         if directory:
             self.save_path.set(directory)
+            self.draw_clip_strip()
             # Auto-load history if available
-            csv_path = os.path.join(directory, "clips_metadata.csv")
-            if os.path.exists(csv_path):
+            if find_metadata(directory) is not None:
                 response = messagebox.askyesno("History Found", 
                     "Found existing clip history in this directory. Load it?")
                 if response:
@@ -342,12 +2888,35 @@ class VideoClipMarker:
             messagebox.showerror("Error", "Video file does not exist")
             return
         
-        self.cap = cv2.VideoCapture(self.video_path.get())
+        if self.is_playing:
+            self.is_playing = False
+            self.play_btn.config(text="▶ Play")
+        self.stop_playback()
+        
+        cap = cv2.VideoCapture(self.video_path.get())
         
-        if not self.cap.isOpened():
+        if not cap.isOpened():
             messagebox.showerror("Error", "Failed to open video file")
             return
         
+        if self.cap is not None:
+            self.cap.release()
+        self.cap = cap
+        old_video = self.store_video()
+        self.loaded_path = self.video_path.get()
+        if not old_video:
+            # Clips marked or loaded before any video was open belong to this one
+            self.annotation_store().move_video(old_video, self.loaded_path)
+        elif old_video != self.loaded_path:
+            # The other video's clips stay in the database; show this one's
+            self.clips = {}
+        self.proxy_path = None
+        self.index = None
+        self.scene_cuts = np.zeros(0, dtype=np.int64)
+        if self.thumbnails is not None:
+            self.thumbnails.stopped = True
+            self.thumbnails = None
+            self.draw_filmstrip()
         self.fps = self.cap.get(cv2.CAP_PROP_FPS)
         self.total_frames = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
         self.video_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
@@ -356,57 +2925,395 @@ class VideoClipMarker:
         self.timeline.config(to=self.total_frames - 1)
         self.current_frame = 0
         
-        self.display_frame()
+        self.attach_playback_source(self.cap, self.loaded_path, None)
         self.update_time_display()
+        self.sync_store()
+        self.draw_clip_strip()
         
-        self.log_action(f"Video loaded: {os.path.basename(self.video_path.get())} "
+        self.log_action(f"Video loaded: {os.path.basename(self.loaded_path)} "
                        f"({self.total_frames} frames, {self.fps:.2f} FPS)")
+        
+        self.start_indexing(self.loaded_path)
+        if self.use_proxy.get():
+            self.start_proxy(self.loaded_path)
     
-    def frames_to_time(self, frame_num):
-        if self.fps == 0:
-            return "00:00:00.000"
+    def playback_source(self):
+        return self.proxy_path or self.loaded_path
+    
+    def attach_playback_source(self, cap, path, index):
+        # Point the UI decoder, frame cache and prefetcher at a new file
+        self.reader = FrameReader(cap, index=index, timer=self.timer)
+        self.frame_cache.clear()
+        if self.prefetcher is not None:
+            self.prefetcher.stop()
+        self.prefetcher = FramePrefetcher(path, self.total_frames, self.frame_cache)
+        self.prefetcher.index = index
+        self.display_frame()
+    
+    def switch_playback_source(self, path, index):
+        cap = cv2.VideoCapture(path)
+        if not cap.isOpened():
+            self.log_action(f"Failed to open playback source: {os.path.basename(path)}")
+            return
         
-        total_seconds = frame_num / self.fps
-        hours = int(total_seconds // 3600)
-        minutes = int((total_seconds % 3600) // 60)
-        seconds = int(total_seconds % 60)
-        milliseconds = int((total_seconds % 1) * 1000)
+        was_playing = self.is_playing
+        self.stop_playback()
+        self.cap.release()
+        self.cap = cap
+        self.attach_playback_source(cap, path, index)
+        if was_playing:
+            self.start_playback()
+    
+    def toggle_proxy(self):
+        if self.cap is None:
+            return
+        if self.use_proxy.get():
+            self.start_proxy(self.loaded_path)
+        elif self.proxy_path is not None:
+            self.proxy_path = None
+            self.switch_playback_source(self.loaded_path, self.index)
+            self.log_action("Proxy disabled, playing original")
+    
+    def start_proxy(self, video_path):
+        self.log_action("Preparing proxy for playback...")
+        self.run_background(lambda: ProxyBuilder(video_path).build(),
+                            lambda proxy_path: self.on_proxy_ready(video_path, proxy_path))
+    
+    def on_proxy_ready(self, video_path, proxy_path):
+        if video_path != self.loaded_path or not self.use_proxy.get() or self.proxy_path:
+            return
+        if proxy_path is None:
+            self.log_action("Proxy generation failed, playing original")
+            return
+        
+        # The proxy has its own short GOP, so the source keyframe index does not apply
+        self.proxy_path = proxy_path
+        self.switch_playback_source(proxy_path, None)
+        self.log_action(f"Playing from proxy: {os.path.basename(proxy_path)}")
+    
+    def run_background(self, work, on_done, poll_ms=250):
+        # Run work() on a worker thread and hand its result to on_done() from
+        # the Tk main loop; the worker itself must never touch widgets
+        result = []
+        
+        def worker():
+            try:
+                result.append(work())
+            except Exception as e:
+                print(f"Background task failed: {e}")
+                result.append(None)
+        
+        def poll():
+            if result:
+                on_done(result[0])
+            else:
+                self.root.after(poll_ms, poll)
+        
+        threading.Thread(target=worker, daemon=True).start()
+        self.root.after(poll_ms, poll)
+    
+    def start_indexing(self, video_path):
+        self.run_background(lambda: KeyframeIndex.load_or_build(video_path),
+                            lambda index: self.on_index_ready(video_path, index))
+    
+    def on_index_ready(self, video_path, index):
+        if index is None or video_path != self.loaded_path:
+            return
+        
+        self.index = index
+        if self.proxy_path is None:
+            self.reader.index = index
+            self.prefetcher.index = index
+        if index.frame_count and index.frame_count != self.total_frames:
+            self.total_frames = index.frame_count
+            self.timeline.config(to=self.total_frames - 1)
+            self.draw_clip_strip()
+        self.update_time_display()
+        
+        self.log_action(f"Keyframe index ready: {len(index.keyframes)} keyframes, "
+                       f"{index.frame_count} frames")
+        self.start_scene_detection(video_path)
+        self.start_filmstrip(video_path)
+    
+    def start_scene_detection(self, video_path):
+        # Needs the indexed frame count so per-range workers can seek exactly;
+        # decodes the proxy instead when one is already in use
+        self.cut_label.config(text="Scene cuts: detecting...")
+        detector = SceneCutDetector(video_path, self.total_frames, self.fps, decode_path=self.proxy_path)
+        self.run_background(detector.detect, lambda cuts: self.on_scene_cuts_ready(video_path, cuts),
+                            poll_ms=500)
+    
+    def on_scene_cuts_ready(self, video_path, cuts):
+        if video_path != self.loaded_path:
+            return
+        if cuts is None:
+            self.cut_label.config(text="Scene cuts: unavailable")
+            return
         
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+        self.scene_cuts = cuts
+        self.cut_label.config(text=f"Scene cuts: {len(cuts)}")
+        self.draw_clip_strip()
+        self.log_action(f"Scene cut detection found {len(cuts)} cuts")
+    
+    def start_filmstrip(self, video_path):
+        # Reuses the cached thumbnails when complete; otherwise fills them in
+        # on a worker thread while poll_filmstrip() redraws as they arrive
+        if self.thumbnails is not None:
+            self.thumbnails.stopped = True
+        strip = ThumbnailStrip(video_path, self.total_frames)
+        self.thumbnails = strip
+        self.filmstrip_shown = -1
+        self.run_background(strip.build, lambda done: self.poll_filmstrip(strip), poll_ms=500)
+        self.root.after(500, lambda: self.poll_filmstrip(strip, repeat=True))
+    
+    def poll_filmstrip(self, strip, repeat=False):
+        if strip is not self.thumbnails:
+            return
+        if strip.done != self.filmstrip_shown:
+            self.draw_filmstrip()
+        if repeat and not strip.finished() and not strip.stopped:
+            self.root.after(500, lambda: self.poll_filmstrip(strip, repeat=True))
+    
+    def draw_filmstrip(self):
+        strip = self.thumbnails
+        width = self.filmstrip.winfo_width()
+        if strip is None or strip.thumbs is None or width <= 1:
+            self.filmstrip.delete("all")
+            self.filmstrip_photo = None
+            return
+        self.filmstrip_shown = strip.done
+        self.filmstrip_photo = ImageTk.PhotoImage(Image.fromarray(strip.strip_image(width)))
+        self.filmstrip.delete("all")
+        self.filmstrip.create_image(0, 0, anchor=tk.NW, image=self.filmstrip_photo)
+    
+    def filmstrip_thumbnail(self, x):
+        # Index of the decoded thumbnail under canvas x, or None
+        strip = self.thumbnails
+        width = self.filmstrip.winfo_width()
+        if strip is None or strip.thumbs is None or width <= 1:
+            return None
+        i = strip.nearest(x / width)
+        return i if i < strip.done else None
+    
+    def preview_filmstrip(self, event):
+        i = self.filmstrip_thumbnail(event.x)
+        if i is None:
+            self.canvas.itemconfig(self.preview_item, state=tk.HIDDEN)
+            return
+        w, h = self.thumbnails.size
+        preview = cv2.resize(self.thumbnails.thumbs[i], (w * 2, h * 2), interpolation=cv2.INTER_LINEAR)
+        self.preview_photo = ImageTk.PhotoImage(Image.fromarray(preview))
+        self.canvas.itemconfig(self.preview_item, image=self.preview_photo, state=tk.NORMAL)
+        self.canvas.tag_raise(self.preview_item)
+    
+    def seek_filmstrip(self, event):
+        i = self.filmstrip_thumbnail(event.x)
+        if i is not None and self.cap is not None:
+            self.seek_video(self.thumbnails.frames[i])
+    
+    def nearest_cut(self, frame_num):
+        # Closest detected cut within SNAP_SECONDS of frame_num, or None
+        cuts = self.scene_cuts
+        if len(cuts) == 0 or self.fps == 0:
+            return None
+        i = np.searchsorted(cuts, frame_num)
+        candidates = cuts[max(0, i - 1):i + 1]
+        cut = int(candidates[np.argmin(np.abs(candidates - frame_num))])
+        return cut if abs(cut - frame_num) <= self.SNAP_SECONDS * self.fps else None
+    
+    def go_to_frame(self, frame_num):
+        self.current_frame = frame_num
+        self.display_frame()
+        self.update_time_display()
+    
+    def jump_to_cut(self, direction):
+        if self.cap is None or len(self.scene_cuts) == 0:
+            return
+        if direction > 0:
+            i = np.searchsorted(self.scene_cuts, self.current_frame, side="right")
+            target = self.scene_cuts[i] if i < len(self.scene_cuts) else None
+        else:
+            i = np.searchsorted(self.scene_cuts, self.current_frame, side="left")
+            target = self.scene_cuts[i - 1] if i > 0 else None
+        if target is None:
+            return
+        if self.is_playing:
+            self.toggle_play()
+        self.go_to_frame(int(target))
+    
+    def frame_seconds(self, frame_num):
+        if self.fps == 0:
+            return 0.0
+        if self.index is not None:
+            return self.index.timestamp(frame_num, self.fps)
+        return frame_num / self.fps
+    
+    def frames_to_time(self, frame_num):
+        return format_timestamp(self.frame_seconds(frame_num))
     
     def display_frame(self):
         if self.cap is None:
             return
         
-        self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.current_frame)
-        ret, frame = self.cap.read()
-        
-        if ret:
-            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = cv2.resize(frame, (640, 360))
-            
-            img = Image.fromarray(frame)
-            imgtk = ImageTk.PhotoImage(image=img)
-            
-            self.canvas.create_image(0, 0, anchor=tk.NW, image=imgtk)
-            self.canvas.image = imgtk
+        frame = self.frame_cache.get(self.current_frame, out=self.renderer.output)
+        if frame is None:
+            ret, frame = self.reader.read(self.current_frame)
+            if not ret:
+                return
+            frame = self.renderer.render(frame)
+            self.frame_cache.put(self.current_frame, frame)
+        
+        self.show_frame(frame)
+        if self.prefetcher is not None and not self.is_playing:
+            self.prefetcher.request(self.current_frame)
+    
+    def show_frame(self, frame):
+        start = time.perf_counter()
+        self.display_buffer[..., :3] = frame
+        self.photo.paste(self.display_image)
+        self.timer.record("photo", time.perf_counter() - start)
+        self.timer.frame_shown()
+    
+    def toggle_hud(self):
+        if self.show_hud.get():
+            self.canvas.itemconfig(self.hud_text, state=tk.NORMAL)
+            self.update_hud()
+        else:
+            self.canvas.itemconfig(self.hud_text, state=tk.HIDDEN)
+    
+    def update_hud(self):
+        if not self.show_hud.get():
+            return
+        if self.engine is not None:
+            self.timer.set("dropped_frames", self.engine.dropped_frames)
+        self.canvas.itemconfig(self.hud_text, text=self.timer.overlay_text())
+        self.canvas.tag_raise(self.hud_text)
+        self.root.after(500, self.update_hud)
+    
+    def dump_stats(self):
+        path = filedialog.asksaveasfilename(title="Save Timing Stats", defaultextension=".json",
+                                            initialfile="clipforge_stats.json",
+                                            filetypes=[("JSON files", "*.json")])
+        if not path:
+            return
+        try:
+            self.timer.dump(path, video=self.loaded_path, playing_from=self.playback_source(),
+                            resolution=[self.video_width, self.video_height], fps=self.fps,
+                            speed=self.playback_speed, cache_mb=self.frame_cache.budget_bytes // (1024 * 1024),
+                            opencv=cv2.__version__, platform=sys.platform,
+                            saved_at=datetime.now().isoformat(timespec="seconds"))
+            self.log_action(f"Timing stats saved: {os.path.basename(path)}")
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to save stats: {e}")
     
     def update_time_display(self):
         current_time = self.frames_to_time(self.current_frame)
         total_time = self.frames_to_time(self.total_frames)
         self.time_label.config(text=f"{current_time} / {total_time}")
+        if self.reader is not None:
+            self.seek_label.config(text=f"Seeks: {self.reader.seek_count}")
+            self.cache_label.config(text=self.frame_cache.stats_text())
         
-        self.updating_slider = True
         self.timeline.set(self.current_frame)
-        self.updating_slider = False
+        
+        if not self.is_playing:
+            self.highlight_overlaps()
+    
+    def annotation_store(self):
+        # The save directory's database once one is chosen. Clips marked
+        # before that are carried over, and the loaded video's rows are merged
+        # with the current clips as soon as it is opened
+        save_dir = self.save_path.get()
+        if save_dir and os.path.isdir(save_dir) and self.store.save_dir != save_dir:
+            try:
+                store = AnnotationStore(save_dir)
+            except sqlite3.Error as e:
+                self.log_action(f"Annotation database unavailable: {e}")
+                return self.store
+            if self.store.save_dir is None:
+                self.store.copy_to(store)
+            self.store.close()
+            self.store = store
+            self.merge_store(store)
+        return self.store
+    
+    def store_video(self):
+        return self.loaded_path or ""
+    
+    def sync_store(self):
+        # Call whenever clips are loaded or the video changes
+        store = self.store
+        if self.annotation_store() is store:
+            self.merge_store(store)
+    
+    def merge_store(self, store):
+        # The database wins for clips it holds (including ones marked in an
+        # earlier session and never exported); clips only held in memory, e.g.
+        # from the CSV, are written to it. Nothing is deleted
+        video = self.store_video()
+        stored = {clip.clip_name: clip for clip in store.records(video, self.labels)}
+        missing = []
+        for clip_id, clip in self.clips.items():
+            if clip.clip_name in stored:
+                self.clips[clip_id] = stored.pop(clip.clip_name)
+            else:
+                missing.append(clip)
+        store.add_many(video, missing)
+        for clip_name, clip in stored.items():
+            self.clips[self.next_clip_id] = clip
+            self.next_clip_id += 1
+            # Continue numbering after the highest "clip_X.mp4"
+            number = clip_name[len("clip_"):-len(".mp4")]
+            if clip_name.startswith("clip_") and clip_name.endswith(".mp4") and number.isdigit():
+                self.clip_counter = max(self.clip_counter, int(number) + 1)
+        self.clip_list.set_records(self.clips)
+    
+    def draw_clip_strip(self):
+        self.clip_strip.delete("all")
+        if self.total_frames <= 0:
+            return
+        width = self.clip_strip.winfo_width()
+        scale = width / self.total_frames
+        for clip in self.annotation_store().overlapping(self.store_video(), 0, self.total_frames):
+            x0 = clip["start_frame"] * scale
+            x1 = max(x0 + 1, (clip["end_frame"] + 1) * scale)
+            self.clip_strip.create_rectangle(x0, 0, x1, 10, fill="#90caf9", outline="",
+                                             tags=("clip", f"clip{clip['id']}"))
+        for cut in self.scene_cuts:
+            x = cut * scale
+            self.clip_strip.create_line(x, 0, x, 10, fill="#424242", tags="cut")
+        self.highlight_overlaps()
+    
+    def highlight_overlaps(self):
+        # Indexed range query, so cheap enough to run on every paused seek
+        if self.total_frames <= 0:
+            return
+        start_frame = self.current_frame if self.start_frame is None else min(self.start_frame, self.current_frame)
+        end_frame = max(self.start_frame or 0, self.current_frame)
+        self.clip_strip.itemconfig("clip", fill="#90caf9")
+        for clip in self.annotation_store().overlapping(self.store_video(), start_frame, end_frame):
+            self.clip_strip.itemconfig(f"clip{clip['id']}", fill="#ff9800")
+    
+    def update_cache_budget(self):
+        try:
+            self.frame_cache.set_budget(self.cache_budget.get())
+        except tk.TclError:
+            return
+        self.cache_label.config(text=self.frame_cache.stats_text())
     
     def seek_video(self, value):
-        if self.updating_slider or self.cap is None:
+        # Scale.set() runs this command later, at idle time, with the value the
+        # UI just set; only a different frame is a user scrub
+        frame_num = int(float(value))
+        if self.cap is None or frame_num == self.current_frame:
             return
         
-        self.current_frame = int(float(value))
+        self.current_frame = frame_num
         self.display_frame()
         self.update_time_display()
+        
+        if self.is_playing:
+            self.start_playback()
     
     def toggle_play(self):
         if self.cap is None:
@@ -417,47 +3324,97 @@ class VideoClipMarker:
         
         if self.is_playing:
             self.play_btn.config(text="⏸ Pause")
-            threading.Thread(target=self.play_video, daemon=True).start()
+            self.start_playback()
         else:
             self.play_btn.config(text="▶ Play")
+            self.stop_playback()
+    
+    def start_playback(self):
+        self.stop_playback()
+        self.engine = PlaybackEngine(self.playback_source(), self.current_frame, self.total_frames,
+                                     self.fps, self.playback_speed, index=self.reader.index, timer=self.timer)
+        self.engine.start()
+        self.timer.set("target_fps", self.fps * abs(self.playback_speed))
+        self.play_due = time.perf_counter()
+        self.play_job = self.root.after(0, self.play_video)
+    
+    def stop_playback(self):
+        if self.play_job is not None:
+            self.root.after_cancel(self.play_job)
+            self.play_job = None
+        if self.engine is not None:
+            self.engine.stop()
+            self.engine = None
+            self.update_speed_label()
     
     def play_video(self):
-        while self.is_playing and self.cap is not None:
-            if self.playback_speed > 0:
-                self.current_frame += abs(self.playback_speed)
-                if self.current_frame >= self.total_frames:
-                    self.current_frame = self.total_frames - 1
-                    self.is_playing = False
-                    self.play_btn.config(text="▶ Play")
-            else:
-                self.current_frame -= abs(self.playback_speed)
-                if self.current_frame < 0:
-                    self.current_frame = 0
-                    self.is_playing = False
-                    self.play_btn.config(text="▶ Play")
-            
-            self.display_frame()
+        # Runs on the Tk main loop; rescheduled with after() while playing
+        self.play_job = None
+        engine = self.engine
+        if not self.is_playing or engine is None:
+            return
+        
+        # How late Tk ran this timer: main-loop load, including painting
+        self.timer.record("tk_delay", max(0.0, time.perf_counter() - self.play_due))
+        
+        item = engine.pop_frame()
+        if item is not None:
+            self.current_frame, frame = item
+            self.frame_cache.put(self.current_frame, frame)
+            self.show_frame(frame)
+            engine.release(frame)
             self.update_time_display()
             
-            delay = int(1000 / (self.fps * abs(self.playback_speed)))
-            self.root.update()
-            self.root.after(delay)
+            now = time.perf_counter()
+            if now - self.speed_shown_at >= 0.5:
+                self.speed_shown_at = now
+                effective = engine.effective_speed()
+                self.timer.set("effective_speed", round(effective, 2))
+                self.update_speed_label(effective)
+        
+        if engine.finished():
+            self.is_playing = False
+            self.play_btn.config(text="▶ Play")
+            self.stop_playback()
+            return
+        
+        delay = max(5, int(1000 / (self.fps * abs(self.playback_speed))))
+        self.play_due = time.perf_counter() + delay / 1000
+        self.play_job = self.root.after(delay, self.play_video)
+    
+    def update_speed_label(self, effective=None):
+        # Nominal speed, plus the speed actually achieved while playing when
+        # decoding can't keep up
+        speed = self.playback_speed
+        arrow = "←" if speed < 0 else "→"
+        text = f"{arrow} {abs(speed)}x"
+        if effective is not None and abs(effective - speed) > 0.05 * abs(speed):
+            text += f" ({abs(effective):.1f}x actual)"
+        self.speed_label.config(text=text)
     
     def set_speed(self, speed):
         self.playback_speed = speed
-        arrow = "←" if speed < 0 else "→"
-        self.speed_label.config(text=f"{arrow} {abs(speed)}x")
+        self.update_speed_label()
         self.log_action(f"Speed changed to {speed}x")
+        
+        if self.is_playing:
+            self.start_playback()
     
     def mark_start(self):
         if self.cap is None:
             messagebox.showerror("Error", "Please load a video first")
             return
         
+        cut = self.nearest_cut(self.current_frame) if self.snap_to_cuts.get() else None
+        if cut is not None and cut != self.current_frame:
+            self.log_action(f"Start snapped to scene cut at {self.frames_to_time(cut)}")
+            self.go_to_frame(cut)
+        
         self.start_frame = self.current_frame
         self.start_time = self.frames_to_time(self.start_frame)
         self.start_label.config(text=f"Start: {self.start_time}")
         self.log_action(f"Start marked at {self.start_time}")
+        self.highlight_overlaps()
     
     def mark_end(self):
         if self.cap is None:
@@ -468,6 +3425,12 @@ class VideoClipMarker:
             messagebox.showerror("Error", "Please mark start first")
             return
         
+        # A clip ends on the last frame before the next shot starts
+        cut = self.nearest_cut(self.current_frame + 1) if self.snap_to_cuts.get() else None
+        if cut is not None and cut - 1 > self.start_frame and cut - 1 != self.current_frame:
+            self.log_action(f"End snapped to scene cut at {self.frames_to_time(cut)}")
+            self.go_to_frame(cut - 1)
+        
         self.end_frame = self.current_frame
         
         if self.end_frame <= self.start_frame:
@@ -485,29 +3448,26 @@ class VideoClipMarker:
         equipment = self.metadata_vars["equipment"].get()
         
         # Store clip
-        clip_data = {
-            "clip_name": clip_name,
-            "start_frame": self.start_frame,
-            "end_frame": self.end_frame,
-            "start_time": self.start_time,
-            "end_time": self.end_time,
-            "action_class": action_class,
-            "description": description,
-            "team": team,
-            "equipment": equipment
-        }
-        
-        self.clips.append(clip_data)
-        
-        # Add to treeview
-        self.clips_tree.insert("", tk.END, values=(
-            clip_name, self.start_time, self.end_time, action_class, description
-        ))
+        clip_data = ClipRecord(clip_name, self.start_frame, self.end_frame,
+                               self.frame_seconds(self.start_frame), self.frame_seconds(self.end_frame),
+                               self.labels.intern(action_class), description,
+                               self.labels.intern(team), self.labels.intern(equipment))
+        
+        store = self.annotation_store()
+        overlaps = store.overlapping(self.store_video(), self.start_frame, self.end_frame)
+        clip_id = self.next_clip_id
+        self.next_clip_id += 1
+        self.clips[clip_id] = clip_data
+        store.add(self.store_video(), clip_data)
+        self.clip_list.add(clip_id)
         
         self.log_action(f"Clip marked: {clip_name} ({self.start_time} - {self.end_time})")
+        if overlaps:
+            self.log_action(f"{clip_name} overlaps {', '.join(clip['clip_name'] for clip in overlaps)}")
         
         self.clip_counter += 1
         self.clear_current()
+        self.draw_clip_strip()
     
     def clear_current(self):
         self.start_frame = None
@@ -522,97 +3482,499 @@ class VideoClipMarker:
             var.set("")
     
     def delete_selected_clip(self):
-        selection = self.clips_tree.selection()
-        if not selection:
+        clip_id = self.clip_list.selected
+        if clip_id is None:
             messagebox.showwarning("Warning", "Please select a clip to delete")
             return
         
-        item = selection[0]
-        values = self.clips_tree.item(item, "values")
-        clip_name = values[0]
-        
-        # Remove from list
-        self.clips = [c for c in self.clips if c["clip_name"] != clip_name]
-        
-        # Remove from treeview
-        self.clips_tree.delete(item)
+        clip_name = self.clips.pop(clip_id).clip_name
+        self.annotation_store().delete(self.store_video(), clip_name)
+        self.clip_list.remove(clip_id)
+        self.draw_clip_strip()
         
         self.log_action(f"Clip deleted: {clip_name}")
     
-    def save_all_clips(self):
+    CLIP_SORT_FIELDS = {"Clip Name": "clip_name", "Start Time": "start_seconds", "End Time": "end_seconds",
+                        "Action Class": "action_class", "Description": "description"}
+    
+    def clip_sort_order(self, clip_ids, column):
+        table = ClipTable.from_records({clip_id: self.clips[clip_id] for clip_id in clip_ids}, self.labels)
+        return table.data["id"][table.argsort(self.CLIP_SORT_FIELDS[column])].tolist()
+    
+    def apply_clip_filter(self):
+        field = self.clip_filter_field.get()
+        text = self.clip_filter_text.get().strip().lower()
+        if field == "At cursor":
+            names = {clip["clip_name"] for clip in
+                     self.annotation_store().overlapping(self.store_video(), self.current_frame, self.current_frame)}
+            self.clip_list.set_filter(lambda clip: clip.clip_name in names)
+        elif text and field == "Action Class":
+            # Exact label, looked up through the store's action class index
+            names = {clip["clip_name"] for clip in
+                     self.annotation_store().by_class(self.clip_filter_text.get().strip(), self.store_video())}
+            self.clip_list.set_filter(lambda clip: clip.clip_name in names)
+        elif text:
+            self.clip_list.set_filter(lambda clip: text in clip.team.lower())
+        else:
+            self.clip_list.set_filter(None)
+    
+    def clear_clip_filter(self):
+        self.clip_filter_text.set("")
+        self.clip_list.set_filter(None)
+    
+    def export_ranges(self):
+        # (clip_name, start_frame, end_frame) for every clip, or None after
+        # telling the user why nothing can be exported
         if not self.clips:
             messagebox.showwarning("Warning", "No clips to save")
-            return
+            return None
         
         if not self.save_path.get():
             messagebox.showerror("Error", "Please select a save directory")
-            return
+            return None
         
         if self.cap is None:
             messagebox.showerror("Error", "No video loaded")
+            return None
+        
+        if self.export_session is not None:
+            messagebox.showwarning("Warning", "An export is already running")
+            return None
+        
+        clips = []
+        for clip in self.clips.values():
+            if clip.start_frame is None or clip.end_frame is None:
+                # Loaded from an older CSV before a video was open
+                clip.start_frame = int(seconds_to_frames(clip.start_seconds, self.fps, self.index))
+                clip.end_frame = int(seconds_to_frames(clip.end_seconds, self.fps, self.index))
+            clips.append((clip.clip_name, clip.start_frame, clip.end_frame))
+        return clips
+    
+    def selected_workers(self):
+        try:
+            return self.export_workers.get()
+        except tk.TclError:
+            return None
+    
+    def save_all_clips(self):
+        clips = self.export_ranges()
+        if clips is None:
             return
         
         save_dir = self.save_path.get()
+        try:
+            scale = int(self.export_scale.get().rstrip("%")) / 100.0
+            session = ExportSession(self.loaded_path, save_dir, self.fps,
+                                    (self.video_width, self.video_height), mode=self.export_mode.get(),
+                                    workers=self.selected_workers(), index=self.index, scale=scale,
+                                    timer=self.timer)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save clips: {str(e)}")
+            self.log_action(f"Error saving clips: {str(e)}")
+            return
+        self.start_export(session, clips, save_dir)
+    
+    def export_dataset(self):
+        clips = self.export_ranges()
+        if clips is None:
+            return
         
         try:
-            # Save video clips
-            for clip in self.clips:
-                output_path = os.path.join(save_dir, clip["clip_name"])
-                
-                # Skip if clip already exists
-                if os.path.exists(output_path):
-                    self.log_action(f"Clip already exists, skipped: {clip['clip_name']}")
-                    continue
-                
-                # Create new VideoCapture for extraction
-                temp_cap = cv2.VideoCapture(self.video_path.get())
-                fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-                out = cv2.VideoWriter(output_path, fourcc, self.fps, 
-                                     (self.video_width, self.video_height))
-                
-                temp_cap.set(cv2.CAP_PROP_POS_FRAMES, clip["start_frame"])
-                
-                for frame_num in range(clip["start_frame"], clip["end_frame"] + 1):
-                    ret, frame = temp_cap.read()
-                    if ret:
-                        out.write(frame)
-                    else:
-                        break
-                
-                temp_cap.release()
-                out.release()
-                
-                self.log_action(f"Clip saved: {clip['clip_name']}")
-            
-            # Create CSV
-            csv_data = []
-            for i, clip in enumerate(self.clips, 1):
-                csv_data.append({
-                    "S.No": i,
-                    "Clip Name": clip["clip_name"],
-                    "Action Class ID": clip["action_class"],
-                    "Start Time Stamp": clip["start_time"],
-                    "End Time Stamp": clip["end_time"],
-                    "Description": clip["description"],
-                    "Team": clip["team"],
-                    "Equipment": clip["equipment"]
-                })
-            
-            df = pd.DataFrame(csv_data)
-            csv_path = os.path.join(save_dir, "clips_metadata.csv")
-            df.to_csv(csv_path, index=False)
-            
-            self.log_action(f"CSV exported: clips_metadata.csv")
-            
-            messagebox.showinfo("Success", 
-                               f"All clips and metadata saved successfully!\n"
-                               f"Location: {save_dir}")
+            width, height = (int(v) for v in self.dataset_size.get().lower().split("x"))
+            stride = self.dataset_stride.get()
+            if width < 1 or height < 1 or stride < 1:
+                raise ValueError
+        except (ValueError, tk.TclError):
+            messagebox.showerror("Error", "Dataset size must look like 224x224 and stride be at least 1")
+            return
+        
+        save_dir = self.save_path.get()
+        try:
+            session = DatasetSession(self.loaded_path, save_dir, self.fps, (width, height),
+                                     fmt=self.dataset_format.get(), stride=stride,
+                                     workers=self.selected_workers(), index=self.index)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export dataset: {str(e)}")
+            self.log_action(f"Error exporting dataset: {str(e)}")
+            return
+        self.start_export(session, clips, save_dir)
+    
+    def start_export(self, session, clips, save_dir):
+        try:
+            for clip_name in session.plan(clips):
+                self.log_action(f"Clip up to date, skipped: {clip_name}")
+            if not session.targets:
+                self.finish_export(save_dir, [], session=session)
+                return
+            session.start()
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save clips: {str(e)}")
+            self.log_action(f"Error saving clips: {str(e)}")
+            return
+        
+        self.export_session = session
+        if session.mode == "Smart cut" and session.exporter.encoder is None:
+            self.log_action("Smart cut needs ffprobe, a keyframe index and a known codec; "
+                            "falling back to keyframe-snapped copy")
+        elif session.mode == "Smart cut" and session.exporter.edge_args is None:
+            self.log_action("Smart cut could not match the source's encoding settings; "
+                            "re-encoding whole clips instead")
+        self.log_action(f"Exporting {len(session.targets)} clips ({session.mode}, "
+                        f"{session.exporter.workers} workers, {session.frame_size[0]}x{session.frame_size[1]})")
+        self.export_cancelled = False
+        self.export_progress.config(maximum=max(1, session.total_frames), value=0)
+        self.cancel_btn.config(state=tk.NORMAL)
+        self.root.after(100, lambda: self.poll_export(save_dir, []))
+    
+    def cancel_export(self):
+        if self.export_session is None:
+            return
+        self.export_cancelled = True
+        self.export_session.cancel()
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.export_status.config(text="Cancelling...")
+        self.log_action("Export cancel requested")
+    
+    def poll_export(self, save_dir, errors):
+        session = self.export_session
+        for clip_name, written, error in session.poll():
+            if error == "Cancelled":
+                continue
+            if error:
+                errors.append(f"{clip_name}: {error}")
+                self.log_action(f"Error saving clip {clip_name}: {error}")
+            else:
+                self.log_action(f"Clip saved: {clip_name} ({written} frames)")
+        
+        done, fps, eta = session.progress()
+        eta_text = time.strftime("%H:%M:%S", time.gmtime(eta)) if eta is not None else "--:--:--"
+        self.export_progress.config(value=done)
+        if not self.export_cancelled:
+            self.export_status.config(text=f"{done}/{session.total_frames} frames, "
+                                           f"{fps:.0f} fps, ETA {eta_text}")
+        
+        if not session.finished():
+            self.root.after(100, lambda: self.poll_export(save_dir, errors))
+            return
         
+        self.timer.set("export_fps", round(fps, 1))
+        session.shutdown()
+        self.export_session = None
+        self.cancel_btn.config(state=tk.DISABLED)
+        self.export_status.config(text="Export cancelled" if self.export_cancelled else "Export finished")
+        self.finish_export(save_dir, errors, cancelled=self.export_cancelled, session=session)
+    
+    def finish_export(self, save_dir, errors, cancelled=False, session=None):
+        try:
+            df = self.export_metadata_csv(save_dir)
+            if isinstance(session, DatasetSession):
+                rows = session.write_index(df)
+                self.log_action(f"Dataset index written: {DatasetSession.INDEX_NAME} ({rows} clips)")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save clips: {str(e)}")
             self.log_action(f"Error saving clips: {str(e)}")
+            return
+        
+        if cancelled:
+            self.log_action("Export cancelled; unfinished clips were discarded")
+            messagebox.showinfo("Cancelled", "Export cancelled. Finished clips were kept, "
+                                "unfinished ones were discarded.")
+            return
+        
+        if errors:
+            messagebox.showerror("Error", f"{len(errors)} clip(s) failed to export:\n" + "\n".join(errors[:10]))
+            return
+        
+        if isinstance(session, DatasetSession):
+            messagebox.showinfo("Success", f"Dataset and index written!\nLocation: {session.save_dir}")
+            return
+        messagebox.showinfo("Success", 
+                           f"All clips and metadata saved successfully!\n"
+                           f"Location: {save_dir}")
+    
+    def export_metadata_csv(self, save_dir):
+        source_hash = source_fingerprint(self.loaded_path) if self.loaded_path else None
+        df = ClipTable.from_records(self.clips, self.labels).to_frame(self.fps, self.loaded_path, source_hash)
+        write_clip_table(df, metadata_path(save_dir))
+        self.log_action(f"CSV exported: clips_metadata.csv")
+        
+        fmt = self.metadata_format.get()
+        if fmt != "CSV":
+            path = metadata_path(save_dir, fmt)
+            try:
+                write_clip_table(df, path)
+                self.log_action(f"{fmt} exported: {os.path.basename(path)}")
+            except ImportError:
+                # Parquet and Feather need pyarrow, which is optional
+                self.log_action(f"{fmt} not written: pyarrow is not installed")
+        return df
 
-if __name__ == "__main__":
+def seconds_to_frames(seconds, fps, index=None):
+    # First frame at or after each time (scalar or array); the inverse of frame
+    # timestamps truncated to milliseconds by format_timestamp
+    seconds = np.asarray(seconds, dtype=np.float64)
+    if index is not None and index.frame_count:
+        return np.searchsorted(index.pts, seconds - 1e-6)
+    return np.ceil(seconds * fps - 1e-6).astype(np.int64)
+
+def format_timestamp(total_seconds):
+    hours = int(total_seconds // 3600)
+    minutes = int((total_seconds % 3600) // 60)
+    seconds = int(total_seconds % 60)
+    milliseconds = int((total_seconds % 1) * 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{milliseconds:03d}"
+
+TEXT_COLUMNS = ["Action Class ID", "Description", "Team", "Equipment"]
+METADATA_FORMATS = {"CSV": ".csv", "Parquet": ".parquet", "Feather": ".feather"}
+
+def metadata_path(save_dir, fmt="CSV"):
+    return os.path.join(save_dir, "clips_metadata" + METADATA_FORMATS[fmt])
+
+def find_metadata(save_dir):
+    # Newest clips_metadata file in save_dir, whatever its format, or None
+    paths = [metadata_path(save_dir, fmt) for fmt in METADATA_FORMATS]
+    paths = [path for path in paths if os.path.exists(path)]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+def write_clip_table(df, path):
+    ext = os.path.splitext(path)[1].lower()
+    tmp_path = path + ".tmp"
+    try:
+        if ext == ".csv":
+            df.to_csv(tmp_path, index=False)
+        elif ext == ".parquet":
+            df.to_parquet(tmp_path, index=False)
+        elif ext == ".feather":
+            df.to_feather(tmp_path)
+        else:
+            raise ValueError(f"Unsupported metadata format: {ext}")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def read_clip_table(path, fps=None, index=None):
+    # Load a clips_metadata file into a DataFrame with integer Start/End Frame
+    # columns (-1 where unknown) and Start/End Seconds parsed from the
+    # timestamps. Frame indices are taken from the file when it has them and
+    # was written at this fps; otherwise they are derived from the timestamps,
+    # which needs fps (older CSVs only have timestamps)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".parquet":
+        df = pd.read_parquet(path)
+    elif ext == ".feather":
+        df = pd.read_feather(path)
+    else:
+        df = pd.read_csv(path, dtype={column: str for column in TEXT_COLUMNS}, keep_default_na=False)
+    df["Clip Name"] = df["Clip Name"].astype(str)
+    df["Start Seconds"] = pd.to_timedelta(df["Start Time Stamp"].astype(str)).dt.total_seconds()
+    df["End Seconds"] = pd.to_timedelta(df["End Time Stamp"].astype(str)).dt.total_seconds()
+    
+    frames = {}
+    for column, time_column in (("Start Frame", "Start Seconds"), ("End Frame", "End Seconds")):
+        values = pd.to_numeric(df[column], errors="coerce") if column in df else pd.Series(np.nan, index=df.index)
+        if fps and "FPS" in df:
+            # Frame numbers written at another fps (e.g. a re-encoded source) don't carry over
+            values = values.where(np.isclose(pd.to_numeric(df["FPS"], errors="coerce"), fps, atol=1e-3))
+        missing = values.isna().to_numpy()
+        if fps and missing.any():
+            values = values.copy()
+            values[missing] = seconds_to_frames(df.loc[missing, time_column].to_numpy(), fps, index)
+        frames[column] = values.fillna(-1).astype(np.int64)
+    df["Start Frame"] = frames["Start Frame"]
+    df["End Frame"] = frames["End Frame"]
+    return df
+
+def clip_ranges(df):
+    # (clip_name, start_frame, end_frame) for every row of a read_clip_table() frame
+    return list(zip(df["Clip Name"], df["Start Frame"].tolist(), df["End Frame"].tolist()))
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mkv", ".mov")
+
+def find_export_pairs(directory):
+    # Every clips_metadata.csv under directory, paired with its source video:
+    # the one named in its Source Video column (as written, or by name next to
+    # the CSV), else the one video that sits next to it (ignoring the exported
+    # clips themselves)
+    pairs = []
+    errors = []
+    for dirpath, _, filenames in os.walk(directory):
+        if "clips_metadata.csv" not in filenames:
+            continue
+        csv_path = os.path.join(dirpath, "clips_metadata.csv")
+        try:
+            df = pd.read_csv(csv_path, keep_default_na=False)
+        except Exception as e:
+            errors.append(f"{csv_path}: {e}")
+            continue
+        sources = set(df["Source Video"].astype(str)) - {""} if "Source Video" in df else set()
+        if len(sources) == 1:
+            source = sources.pop()
+            candidates = [source, os.path.join(dirpath, os.path.basename(source))]
+            found = [path for path in candidates if os.path.isfile(path)]
+            if found:
+                pairs.append((found[0], csv_path))
+            else:
+                errors.append(f"{csv_path}: source video {source} not found")
+            continue
+        clip_names = set(df["Clip Name"].astype(str))
+        videos = [name for name in filenames
+                  if name.lower().endswith(VIDEO_EXTENSIONS) and name not in clip_names
+                  and not name.startswith(".")]
+        if len(videos) == 1:
+            pairs.append((os.path.join(dirpath, videos[0]), csv_path))
+        else:
+            errors.append(f"{csv_path}: expected one source video next to it, found {len(videos)}")
+    return pairs, errors
+
+def emit(event, **fields):
+    # One JSON object per line on stdout for the batch export progress
+    print(json.dumps({"event": event, **fields}), flush=True)
+
+def run_batch_export(argv):
+    parser = argparse.ArgumentParser(prog="ClipForge.py export",
+                                     description="Export clips listed in clips_metadata.csv files without the GUI")
+    parser.add_argument("--pair", nargs=2, action="append", default=[], metavar=("VIDEO", "CSV"),
+                        help="source video and its clips_metadata.csv (repeatable)")
+    parser.add_argument("--dir", action="append", default=[],
+                        help="search a directory tree for clips_metadata.csv files (repeatable)")
+    parser.add_argument("--output-dir", help="write clips here instead of next to each CSV")
+    parser.add_argument("--mode", choices=EXPORT_MODES, default=EXPORT_MODES[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="downscale factor for re-encoded clips, e.g. 0.5")
+    parser.add_argument("--dataset", choices=list(DATASET_FORMATS),
+                        help="write training data (arrays or image folders) instead of video clips")
+    parser.add_argument("--size", default="224x224", help="dataset frame size as WIDTHxHEIGHT")
+    parser.add_argument("--stride", type=int, default=1, help="keep every Nth frame in the dataset")
+    args = parser.parse_args(argv)
+    try:
+        dataset_size = tuple(int(v) for v in args.size.lower().split("x"))
+        if len(dataset_size) != 2 or min(dataset_size) < 1:
+            raise ValueError
+    except ValueError:
+        parser.error("--size must look like 224x224")
+    
+    pairs = [tuple(pair) for pair in args.pair]
+    failures = 0
+    for directory in args.dir:
+        found, errors = find_export_pairs(directory)
+        pairs.extend(found)
+        for error in errors:
+            emit("error", message=error)
+            failures += 1
+    if not pairs:
+        parser.error("nothing to export; pass --pair VIDEO CSV or --dir DIR")
+    
+    workers = max(1, args.workers)
+    # One labels.csv for the whole run, so every video numbers classes alike
+    labels_root = args.output_dir or os.path.commonpath([os.path.dirname(os.path.abspath(csv_path))
+                                                         for _, csv_path in pairs])
+    labels_path = os.path.join(labels_root, DatasetLabels.FILENAME)
+    pool = make_process_pool(workers) if args.dataset or args.mode == EXPORT_MODES[0] else None
+    sessions = []
+    tables = {}
+    total_clips = 0
+    for video_path, csv_path in pairs:
+        try:
+            cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                raise RuntimeError("could not open video")
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+            cap.release()
+            
+            index = KeyframeIndex.load_or_build(video_path)
+            save_dir = os.path.dirname(os.path.abspath(csv_path))
+            if args.output_dir:
+                save_dir = args.output_dir
+                if len(pairs) > 1:
+                    save_dir = os.path.join(save_dir, os.path.splitext(os.path.basename(video_path))[0])
+            os.makedirs(save_dir, exist_ok=True)
+            
+            df = read_clip_table(csv_path, fps, index)
+            if args.dataset:
+                session = DatasetSession(video_path, save_dir, fps, dataset_size, fmt=args.dataset,
+                                         stride=args.stride, workers=workers, index=index, pool=pool,
+                                         labels_path=labels_path)
+                tables[session] = df
+            else:
+                session = ExportSession(video_path, save_dir, fps, frame_size, mode=args.mode,
+                                        workers=workers, index=index, pool=pool, scale=args.scale)
+            up_to_date = session.plan(clip_ranges(df))
+        except Exception as e:
+            emit("error", video=video_path, message=str(e))
+            failures += 1
+            continue
+        
+        emit("planned", video=video_path, clips=len(session.targets), up_to_date=len(up_to_date))
+        if session.targets:
+            sessions.append(session)
+            total_clips += len(session.targets)
+    
+    # A shared process pool bounds the work for re-encoding; the other modes
+    # run their own workers, so only a few sources are started at once
+    waiting = collections.deque(sessions)
+    running = []
+    done_clips = 0
+    done_frames = 0
+    start_time = time.perf_counter()
+    try:
+        while waiting or running:
+            while waiting and (pool is not None or len(running) < workers):
+                session = waiting.popleft()
+                try:
+                    session.start()
+                    running.append(session)
+                except Exception as e:
+                    emit("error", video=session.video_path, message=str(e))
+                    failures += len(session.targets)
+            
+            still_running = []
+            for session in running:
+                finished = session.finished()
+                for clip_name, written, error in session.poll():
+                    done_clips += 1
+                    done_frames += written
+                    if error:
+                        failures += 1
+                    elapsed = time.perf_counter() - start_time
+                    emit("clip", video=session.video_path, clip=clip_name, frames=written, error=error,
+                         done=done_clips, total=total_clips, elapsed=round(elapsed, 3),
+                         fps=round(done_frames / elapsed, 1) if elapsed > 0 else 0.0)
+                if finished:
+                    session.shutdown()
+                    if session in tables:
+                        emit("index", video=session.video_path, clips=session.write_index(tables.pop(session)))
+                else:
+                    still_running.append(session)
+            running = still_running
+            time.sleep(0.1)
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+    
+    # Sources whose dataset was already up to date still get an index
+    for session, df in tables.items():
+        if not session.targets:
+            emit("index", video=session.video_path, clips=session.write_index(df))
+    
+    elapsed = time.perf_counter() - start_time
+    emit("summary", videos=len(pairs), clips=done_clips, failed=failures, frames=done_frames,
+         elapsed=round(elapsed, 3), fps=round(done_frames / elapsed, 1) if elapsed > 0 else 0.0)
+    return 1 if failures else 0
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "export":
+        return run_batch_export(argv[1:])
+    
+    import_gui()
     root = tk.Tk()
     app = VideoClipMarker(root)
     root.mainloop()
+    app.logger.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+import ClipForge as cf
+
+# Performance benchmarks for the playback, seek, export and history paths.
+# Synthetic test videos are generated locally with cv2.VideoWriter, so runs
+# are reproducible on any machine. Results are written as JSON with one flat
+# metric per key; --compare checks them against an earlier run
+#
+#   python benchmark.py --quick --output results.json
+#   python benchmark.py --quick --compare results.json
+
+FULL = {
+    "resolutions": [(640, 360), (1280, 720), (1920, 1080)],
+    "frame_count": 900,
+    "keyframe_intervals": [1, 12, 250],
+    "seek_samples": 60,
+    "playback_seconds": 3.0,
+    "export_clips": 12,
+    "history_rows": [1000, 10000, 50000],
+}
+
+QUICK = {
+    "resolutions": [(640, 360)],
+    "frame_count": 300,
+    "keyframe_intervals": [12, 250],
+    "seek_samples": 20,
+    "playback_seconds": 1.0,
+    "export_clips": 4,
+    "history_rows": [1000, 10000],
+}
+
+FPS = 30.0
+
+def write_frames(path, fourcc, width, height, frame_count, params=()):
+    # Moving gradient plus a frame counter so every frame is distinct and
+    # decoding does real work
+    writer = cv2.VideoWriter(path, cv2.CAP_FFMPEG, cv2.VideoWriter_fourcc(*fourcc), FPS,
+                             (width, height), list(params))
+    if not writer.isOpened():
+        raise RuntimeError(f"Failed to create {path}")
+
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    try:
+        for i in range(frame_count):
+            frame[..., 0] = (x + i * 3) % 256
+            frame[..., 1] = (y + i * 2) % 256
+            frame[..., 2] = (x[::-1] + y) % 256
+            cv2.putText(frame, str(i), (20, height // 2), cv2.FONT_HERSHEY_SIMPLEX,
+                        height / 120, (255, 255, 255), max(1, height // 180))
+            writer.write(frame)
+    finally:
+        writer.release()
+
+def make_video(workdir, width, height, frame_count, keyframe_interval):
+    # Intra-only MJPG for a keyframe interval of 1. Longer GOPs are encoded with
+    # ffmpeg when it is installed; otherwise with OpenCV's mp4v writer, which
+    # only honours the interval on builds that support VIDEOWRITER_PROP_KEY_INTERVAL
+    # (the index-measured interval is reported either way)
+    name = f"{width}x{height}_gop{keyframe_interval}_{frame_count}"
+    if keyframe_interval == 1:
+        path = os.path.join(workdir, name + ".avi")
+        if not os.path.exists(path):
+            write_frames(path, "MJPG", width, height, frame_count)
+        return path
+
+    path = os.path.join(workdir, name + ".mp4")
+    if os.path.exists(path):
+        return path
+    if shutil.which("ffmpeg"):
+        source = os.path.join(workdir, name + ".src.avi")
+        write_frames(source, "MJPG", width, height, frame_count)
+        subprocess.run(["ffmpeg", "-v", "error", "-y", "-i", source, "-c:v", "libx264",
+                        "-g", str(keyframe_interval), "-keyint_min", str(keyframe_interval),
+                        "-sc_threshold", "0", "-pix_fmt", "yuv420p", path], check=True)
+        os.remove(source)
+    else:
+        params = []
+        if hasattr(cv2, "VIDEOWRITER_PROP_KEY_INTERVAL"):
+            params = [cv2.VIDEOWRITER_PROP_KEY_INTERVAL, keyframe_interval]
+        write_frames(path, "mp4v", width, height, frame_count, params)
+    return path
+
+def make_vfr_video(workdir, width, height, frame_count, keyframe_interval=24):
+    # Variable frame rate H.264: every third frame is shown twice as long, so
+    # frame numbers and nominal-fps timestamps drift apart. Needs ffmpeg
+    path = os.path.join(workdir, f"{width}x{height}_vfr_{frame_count}.mkv")
+    if os.path.exists(path):
+        return path
+    source = os.path.join(workdir, f"{width}x{height}_vfr_{frame_count}.src.avi")
+    write_frames(source, "MJPG", width, height, frame_count)
+    subprocess.run(["ffmpeg", "-v", "error", "-y", "-i", source, "-vf", f"setpts=(N+floor(N/3))/({FPS}*TB)",
+                    "-fps_mode", "vfr", "-c:v", "libx264", "-g", str(keyframe_interval),
+                    "-pix_fmt", "yuv420p", path], check=True)
+    os.remove(source)
+    return path
+
+def check_seek_accuracy(path, index, samples):
+    # Random reads through FrameReader against a plain sequential decode;
+    # returns how many came back as the wrong frame
+    cap = cv2.VideoCapture(path)
+    expected = []
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            expected.append(frame[::8, ::8].copy())
+    finally:
+        cap.release()
+
+    cap = cv2.VideoCapture(path)
+    reader = cf.FrameReader(cap, index=index)
+    rng = np.random.default_rng(0)
+    mismatches = 0
+    try:
+        for frame_num in rng.integers(0, len(expected), samples):
+            ret, frame = reader.read(int(frame_num))
+            if not ret or not np.array_equal(frame[::8, ::8], expected[frame_num]):
+                mismatches += 1
+    finally:
+        cap.release()
+    return mismatches
+
+def latency_stats(prefix, samples):
+    samples = np.asarray(samples) * 1000.0
+    return {
+        f"{prefix}/mean_ms": float(samples.mean()),
+        f"{prefix}/p50_ms": float(np.percentile(samples, 50)),
+        f"{prefix}/p95_ms": float(np.percentile(samples, 95)),
+        f"{prefix}/max_ms": float(samples.max()),
+    }
+
+def bench_seek(path, index, samples):
+    # Random frame access as in seek_video/display_frame: seek, decode, render
+    cap = cv2.VideoCapture(path)
+    total = index.frame_count or int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    reader = cf.FrameReader(cap, index=index)
+    renderer = cf.FrameRenderer(*cf.DISPLAY_SIZE)
+    rng = np.random.default_rng(0)
+    latencies = []
+    try:
+        for frame_num in rng.integers(0, total, samples):
+            start = time.perf_counter()
+            ret, frame = reader.read(int(frame_num))
+            if not ret:
+                raise RuntimeError(f"Failed to read frame {frame_num} of {path}")
+            renderer.render(frame)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        cap.release()
+    return latencies
+
+def bench_playback(path, index, speed, seconds):
+    # Drives PlaybackEngine the way play_video does: poll on the same timer
+    # interval and copy each due frame into a display buffer
+    total = index.frame_count
+    start_frame = total - 1 if speed < 0 else 0
+    engine = cf.PlaybackEngine(path, start_frame, total, FPS, speed, index=index)
+    display = np.empty((cf.DISPLAY_SIZE[1], cf.DISPLAY_SIZE[0], 3), dtype=np.uint8)
+    delay = max(5, int(1000 / (FPS * abs(speed)))) / 1000.0
+    shown = 0
+    engine.start()
+    try:
+        while time.perf_counter() - engine.start_time < seconds and not engine.finished():
+            item = engine.pop_frame()
+            if item is not None:
+                _, frame = item
+                display[...] = frame
+                engine.release(frame)
+                shown += 1
+            time.sleep(delay)
+        elapsed = time.perf_counter() - engine.start_time
+    finally:
+        engine.stop()
+    return {
+        "display_fps": shown / elapsed,
+        "effective_speed": abs(engine.effective_speed()),
+        "dropped_frames": engine.dropped_frames,
+        "skipped_frames": engine.skipped_frames,
+    }
+
+def bench_export(path, index, mode, clip_count, workdir):
+    # Frames per second written by a full ExportSession run
+    total = index.frame_count
+    length = total // (clip_count + 1)
+    clips = [(f"clip_{i}.mp4", i * length, i * length + length - 1) for i in range(clip_count)]
+    cap = cv2.VideoCapture(path)
+    frame_size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    cap.release()
+
+    # The exported clips are removed afterwards, even when --workdir is kept
+    with tempfile.TemporaryDirectory(prefix="export_", dir=workdir) as save_dir:
+        session = cf.ExportSession(path, save_dir, FPS, frame_size, mode=mode,
+                                   workers=os.cpu_count(), index=index)
+        session.plan(clips)
+        frames = session.total_frames
+        start = time.perf_counter()
+        session.start()
+        errors = []
+        while not session.finished():
+            errors += [error for _, _, error in session.poll() if error]
+            time.sleep(0.01)
+        errors += [error for _, _, error in session.poll() if error]
+        elapsed = time.perf_counter() - start
+        session.shutdown()
+    if errors:
+        raise RuntimeError(f"{mode} export failed: {errors[0]}")
+    return frames / elapsed
+
+def bench_history(rows, workdir):
+    # Save and reload a clips_metadata.csv with `rows` clips
+    labels = cf.CategoryTable()
+    classes = ["goal", "foul", "corner", "offside", "save"]
+    records = {i: cf.ClipRecord(f"clip_{i}.mp4", i * 90, i * 90 + 60, i * 3.0, i * 3.0 + 2.0,
+                                labels.intern(classes[i % 5]), f"clip {i}", labels.intern(f"Team {i % 2}"),
+                                labels.intern("Ball"))
+               for i in range(1, rows + 1)}
+    path = os.path.join(workdir, f"history_{rows}.csv")
+
+    start = time.perf_counter()
+    cf.write_clip_table(cf.ClipTable.from_records(records, labels).to_frame(FPS), path)
+    save_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df = cf.read_clip_table(path, FPS)
+    loaded = dict(cf.ClipTable.from_frame(df, cf.CategoryTable()).records())
+    load_time = time.perf_counter() - start
+    assert len(loaded) == rows
+    return save_time, load_time
+
+def run(config, workdir, export_modes, log):
+    results = {}
+    for width, height in config["resolutions"]:
+        for gop in config["keyframe_intervals"]:
+            name = f"{width}x{height}_gop{gop}"
+            path = make_video(workdir, width, height, config["frame_count"], gop)
+            index = cf.KeyframeIndex.load_or_build(path)
+            interval = index.frame_count / max(1, len(index.keyframes))
+            results[f"video/{name}/keyframe_interval"] = interval
+            log(f"{name}: {len(index.keyframes)} keyframes, {index.frame_count} frames")
+
+            results.update(latency_stats(f"seek/{name}", bench_seek(path, index, config["seek_samples"])))
+
+            for speed in cf.PLAYBACK_SPEEDS:
+                stats = bench_playback(path, index, speed, config["playback_seconds"])
+                for key, value in stats.items():
+                    results[f"playback/{name}/{speed}x/{key}"] = value
+                log(f"  {speed:>3}x: {stats['display_fps']:.1f} fps shown, "
+                    f"{stats['effective_speed']:.2f}x effective")
+
+            for mode in export_modes:
+                fps = bench_export(path, index, mode, config["export_clips"], workdir)
+                results[f"export/{name}/{mode}/fps"] = fps
+                log(f"  export {mode}: {fps:.0f} frames/s")
+
+    if shutil.which("ffmpeg"):
+        width, height = config["resolutions"][0]
+        path = make_vfr_video(workdir, width, height, config["frame_count"])
+        index = cf.KeyframeIndex.load_or_build(path)
+        mismatches = check_seek_accuracy(path, index, config["seek_samples"])
+        results["accuracy/vfr/seek_mismatches"] = mismatches
+        log(f"VFR seek accuracy: {mismatches} of {config['seek_samples']} reads returned the wrong frame")
+    else:
+        log("ffmpeg not found, skipping the VFR seek accuracy check")
+
+    for rows in config["history_rows"]:
+        save_time, load_time = bench_history(rows, workdir)
+        results[f"history/{rows}/save_s"] = save_time
+        results[f"history/{rows}/load_s"] = load_time
+        log(f"history {rows} rows: save {save_time:.3f} s, load {load_time:.3f} s")
+    return results
+
+def compared(metric):
+    # Properties of the test videos and correctness checks, not performance
+    return not metric.startswith(("video/", "accuracy/"))
+
+def lower_is_better(metric):
+    return metric.endswith(("_ms", "_s", "dropped_frames", "skipped_frames"))
+
+# Absolute differences below these are timer and scheduling noise
+NOISE_FLOOR = {"_ms": 1.0, "_s": 0.005, "dropped_frames": 5, "skipped_frames": 5}
+
+def noise_floor(metric):
+    return next((floor for suffix, floor in NOISE_FLOOR.items() if metric.endswith(suffix)), 0.0)
+
+def compare(results, baseline, threshold):
+    # Metrics that got worse than the baseline by more than threshold
+    regressions = []
+    for metric, value in sorted(results.items()):
+        old = baseline.get(metric)
+        if not old or not compared(metric) or abs(value - old) < noise_floor(metric):
+            continue
+        change = (value - old) / abs(old)
+        if lower_is_better(metric):
+            change = -change
+        if change < -threshold:
+            regressions.append((metric, old, value, change))
+    return regressions
+
+def benchmark(args, config_name, workdir, baseline):
+    config = QUICK if args.quick else FULL
+
+    def log(message):
+        print(message, file=sys.stderr, flush=True)
+
+    results = run(config, workdir, args.modes, log)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": config_name,
+            "python": platform.python_version(),
+            "opencv": cv2.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    log(f"Results written to {args.output}")
+
+    # Correctness, not speed: any wrong frame fails the run
+    wrong = {metric: value for metric, value in results.items() if metric.startswith("accuracy/") and value}
+    for metric, value in wrong.items():
+        log(f"FAILED {metric}: {value}")
+
+    if baseline is not None:
+        regressions = compare(results, baseline["results"], args.threshold)
+        for metric, old, new, change in regressions:
+            log(f"REGRESSION {metric}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+        if regressions:
+            return 1
+        log(f"No regressions against {args.compare}")
+    return 1 if wrong else 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ClipForge performance benchmarks")
+    parser.add_argument("--quick", action="store_true", help="small configuration for a fast check")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--workdir", help="keep synthetic videos here between runs (default: a temp dir)")
+    parser.add_argument("--modes", nargs="+", choices=cf.EXPORT_MODES,
+                        default=["Parallel re-encode", "Single pass"], help="export modes to measure")
+    parser.add_argument("--compare", metavar="BASELINE", help="earlier results JSON to check against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown that counts as a regression (default 0.2)")
+    args = parser.parse_args(argv)
+
+    config_name = "quick" if args.quick else "full"
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        # Quick and full runs use different videos and durations
+        if baseline["meta"]["config"] != config_name:
+            parser.error(f"{args.compare} is a {baseline['meta']['config']} run; "
+                         f"compare it with a {baseline['meta']['config']} run")
+
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        return benchmark(args, config_name, args.workdir, baseline)
+    with tempfile.TemporaryDirectory(prefix="clipforge_bench_") as workdir:
+        return benchmark(args, config_name, workdir, baseline)
+
+if __name__ == "__main__":
+    sys.exit(main())